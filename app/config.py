@@ -1,13 +1,30 @@
-from typing import List, Dict
-import pytz
+import os
+from datetime import timezone
+from typing import List, Dict, Tuple
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+
+# .env загружается до чтения переменных ниже: импорт конфига случается
+# раньше, чем load_dotenv в точке входа, и без этого настройки вебхука
+# из .env молча терялись
+load_dotenv()
 
 # Настройки времени
-TIMEZONE = pytz.timezone('Europe/Moscow')  # Московское время
+# Один объект таймзоны на весь процесс; stdlib zoneinfo читает системную
+# tzdata напрямую и не тянет лишнюю зависимость
+MOSCOW_TZ = ZoneInfo('Europe/Moscow')  # Московское время
+UTC = timezone.utc
+TIMEZONE = MOSCOW_TZ
 SCHEDULED_HOURS: List[int] = [8, 21]  # Часы для отправки уведомлений (по московскому времени)
 SCHEDULED_MINUTES: Dict[int, int] = {
     8: 0,   # 8:00
     21: 30  # 21:30
 }
+# Плотный список минут по часам: индексация дешевле хеширования ключа,
+# -1 означает, что на этот час обновление не запланировано
+SCHEDULED_MIN_LIST: List[int] = [SCHEDULED_MINUTES.get(h, -1) for h in range(24)]
+# Пары (час, минута), отсортированные один раз при импорте
+SCHEDULED_TIMES: Tuple[Tuple[int, int], ...] = tuple(sorted(SCHEDULED_MINUTES.items()))
 
 # Список городов для мониторинга
 MONITORED_CITIES: List[str] = [
@@ -25,9 +42,20 @@ CITY_NAMES: Dict[str, str] = {
     "Belgrade": "Белград"
 }
 
+# Пары (ключ города, отображаемое имя), предвычисленные один раз при импорте
+MONITORED_CITY_PAIRS: Tuple[Tuple[str, str], ...] = tuple(
+    (c, CITY_NAMES.get(c, c)) for c in MONITORED_CITIES
+)
+
 # Интервал обновления данных в секундах
 UPDATE_INTERVAL: int = 1800  # 30 минут
 
+# Настройки вебхука Telegram: если WEBHOOK_URL задан, бот принимает
+# обновления пушем вместо постоянного опроса getUpdates
+WEBHOOK_URL: str = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+WEBHOOK_PORT: int = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH: str = os.getenv("TELEGRAM_WEBHOOK_PATH", "telegram")
+
 # Настройки уведомлений
 NOTIFICATION_SETTINGS: Dict[str, bool] = {
     "SEND_REGULAR_UPDATES": True,  # Отправлять регулярные обновления
@@ -1,24 +1,68 @@
 import logging
+import time
 from datetime import datetime
-from typing import Optional, Callable, AsyncContextManager, AsyncGenerator
+from typing import Optional, Callable, AsyncContextManager, Dict, Tuple
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from contextlib import asynccontextmanager
-import pytz
+from .config import MOSCOW_TZ, UTC
 
 logger = logging.getLogger(__name__)
 
+# Маппинг ID городов OpenWeather в названия, под которыми записи хранятся в БД
+_CITY_ID_TO_NAME = {
+    "524901": "Moscow",
+    "498817": "Saint Petersburg",
+    "504341": "Pskov",
+    "792680": "Belgrade"
+}
+
+# Запросы компилируются в TextClause один раз при импорте, а не на каждый вызов
+_INSERT_WEATHER = text("""
+    INSERT INTO weather_records
+    (city, temperature, humidity, wind_speed, description, recorded_at, timezone)
+    VALUES (:city, :temp, :humidity, :wind, :descr, NOW() AT TIME ZONE 'UTC', :tz)
+    RETURNING id
+""")
+
+_INSERT_WEATHER_BATCH = text("""
+    INSERT INTO weather_records
+    (city, temperature, humidity, wind_speed, description, recorded_at, timezone)
+    VALUES (:city, :temp, :humidity, :wind, :descr, NOW() AT TIME ZONE 'UTC', :tz)
+""")
+
+_SELECT_LATEST = text("""
+    SELECT id, temperature, humidity, wind_speed, description, recorded_at, timezone
+    FROM weather_records
+    WHERE city = :city
+    ORDER BY recorded_at DESC
+    LIMIT 1
+""")
+
+_SELECT_LATEST_ALL = text("""
+    SELECT DISTINCT ON (city)
+        city, temperature, humidity, wind_speed, description, recorded_at, timezone
+    FROM weather_records
+    ORDER BY city, recorded_at DESC
+""")
+
+_DELETE_OLD = text("""
+    DELETE FROM weather_records
+    WHERE recorded_at < NOW() - make_interval(days => :days)
+""")
+
+# Сколько секунд держать последнюю запись города в памяти, не обращаясь к БД
+_LATEST_CACHE_TTL = 60.0
+
 class DatabaseService:
     def __init__(self, get_session: Callable[[], AsyncContextManager[AsyncSession]]):
         self.get_session = get_session
-        self.moscow_tz = pytz.timezone('Europe/Moscow')
-        
-    def _convert_to_moscow_time(self, utc_dt: datetime) -> datetime:
-        """Convert UTC datetime to Moscow time"""
-        if utc_dt.tzinfo is None:
-            utc_dt = pytz.UTC.localize(utc_dt)
-        return utc_dt.astimezone(self.moscow_tz)
+        # Кэш последних записей по городам: city -> (monotonic-время записи, данные)
+        self._latest_cache: Dict[str, Tuple[float, dict]] = {}
+
+    def _naive_utc_to_moscow(self, utc_dt: datetime) -> datetime:
+        """Convert a naive UTC datetime to Moscow time"""
+        return utc_dt.replace(tzinfo=UTC).astimezone(MOSCOW_TZ)
         
     async def stop(self) -> None:
         """Stop the database service"""
@@ -26,28 +70,6 @@ class DatabaseService:
         # and sessions are managed by the context manager
         logger.info("Database service stopped")
         
-    @asynccontextmanager
-    async def _transaction(self) -> AsyncGenerator[AsyncSession, None]:
-        """
-        Transaction context manager that ensures proper commit/rollback handling
-        """
-        async with self.get_session() as session:
-            try:
-                yield session
-                await session.commit()
-                logger.debug("Transaction committed successfully")
-            except SQLAlchemyError as e:
-                await session.rollback()
-                logger.error(f"Transaction rolled back due to error: {e}")
-                raise
-            except Exception as e:
-                await session.rollback()
-                logger.error(f"Transaction rolled back due to unexpected error: {e}")
-                raise
-            finally:
-                await session.close()
-                logger.debug("Database session closed")
-
     async def save_weather_record(self, city: str, temperature: float, humidity: int,
                                 wind_speed: float, description: str, timezone: str) -> bool:
         """
@@ -57,25 +79,19 @@ class DatabaseService:
             bool: True if save was successful, False otherwise
         """
         try:
-            async with self._transaction() as session:
-                query = text("""
-                    INSERT INTO weather_records 
-                    (city, temperature, humidity, wind_speed, description, recorded_at, timezone)
-                    VALUES (:city, :temp, :humidity, :wind, :descr, :recorded, :tz)
-                    RETURNING id
-                """)
-                
-                result = await session.execute(query, {
+            async with self.get_session() as session:
+                result = await session.execute(_INSERT_WEATHER, {
                     "city": city,
                     "temp": temperature,
                     "humidity": humidity,
                     "wind": wind_speed,
                     "descr": description,
-                    "recorded": datetime.utcnow(),
                     "tz": timezone
                 })
                 
                 record_id = result.scalar_one()
+                # Свежая запись делает кэшированные данные устаревшими
+                self._latest_cache.clear()
                 logger.info(f"Saved weather record for {city} with id {record_id}")
                 return True
                 
@@ -86,6 +102,34 @@ class DatabaseService:
             logger.error(f"Unexpected error saving weather record: {e}")
             return False
 
+    async def save_weather_records_batch(self, records: list[dict]) -> bool:
+        """
+        Save several weather records in a single INSERT
+
+        Args:
+            records: List of param dicts with keys
+                city, temp, humidity, wind, descr, tz
+
+        Returns:
+            bool: True if save was successful, False otherwise
+        """
+        if not records:
+            return True
+
+        try:
+            async with self.get_session() as session:
+                await session.execute(_INSERT_WEATHER_BATCH, records)
+                self._latest_cache.clear()
+                logger.info(f"Saved {len(records)} weather records in one batch")
+                return True
+
+        except SQLAlchemyError as e:
+            logger.error(f"Database error saving weather record batch: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error saving weather record batch: {e}")
+            return False
+
     async def get_latest_weather(self, city: str) -> Optional[dict]:
         """
         Get latest weather record for city
@@ -95,60 +139,59 @@ class DatabaseService:
         """
         try:
             # Преобразуем ID города в название
-            city_names = {
-                "524901": "Moscow",
-                "498817": "Saint Petersburg",
-                "504341": "Pskov",
-                "792680": "Belgrade"
-            }
-            city_name = city_names.get(city)
+            city_name = _CITY_ID_TO_NAME.get(city)
             if not city_name:
-                print(f"Unknown city ID: {city}")
+                logger.error(f"Unknown city ID: {city}")
                 return None
 
-            async with self._transaction() as session:
-                # Сначала проверим все записи в таблице
-                check_query = text("SELECT DISTINCT city FROM weather_records")
-                result = await session.execute(check_query)
-                cities = result.fetchall()
-                print(f"\nAvailable cities in database: {[city[0] for city in cities]}")
-                print(f"Looking for city: {city_name}")
-                
-                query = text("""
-                    SELECT id, temperature, humidity, wind_speed, description, recorded_at, timezone
-                    FROM weather_records
-                    WHERE city = :city
-                    ORDER BY recorded_at DESC
-                    LIMIT 1
-                    FOR UPDATE SKIP LOCKED
-                """)
-                
-                result = await session.execute(query, {"city": city_name})
-                record = result.fetchone()
-                
-                if record:
-                    moscow_time = self._convert_to_moscow_time(record.recorded_at)
-                    return {
-                        "id": record.id,
-                        "temperature": record.temperature,
-                        "humidity": record.humidity,
-                        "wind_speed": record.wind_speed,
-                        "description": record.description,
-                        "recorded_at": record.recorded_at,
-                        "recorded_at_moscow": moscow_time,
-                        "timezone": record.timezone
-                    }
+            # Отдаем из памяти, пока запись не устарела — погода меняется
+            # не чаще UPDATE_INTERVAL, держать БД в горячем пути незачем
+            cached = self._latest_cache.get(city)
+            if cached and time.monotonic() - cached[0] < _LATEST_CACHE_TTL:
+                return cached[1]
+
+            async with self.get_session() as session:
+                result = await session.execute(_SELECT_LATEST, {"city": city_name})
+                row = result.mappings().first()
+
+                if row:
+                    recorded_at = row["recorded_at"]
+                    # timestamptz приходит уже aware — конвертируем напрямую,
+                    # локализация нужна только наивным datetime
+                    if recorded_at.tzinfo is not None:
+                        moscow_time = recorded_at.astimezone(MOSCOW_TZ)
+                    else:
+                        moscow_time = self._naive_utc_to_moscow(recorded_at)
+                    data = {**row, "recorded_at_moscow": moscow_time}
+                    self._latest_cache[city] = (time.monotonic(), data)
+                    return data
                 return None
                 
         except SQLAlchemyError as e:
             logger.error(f"Database error retrieving weather history: {e}")
-            print(f"SQL Error: {str(e)}")
             return None
         except Exception as e:
             logger.error(f"Unexpected error retrieving weather history: {e}")
-            print(f"Error: {str(e)}")
             return None
 
+    async def get_latest_all(self) -> Dict[str, dict]:
+        """
+        Get the newest weather record per city in one query
+
+        Returns:
+            Dict[str, dict]: Mapping of stored city name to its latest record
+        """
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(_SELECT_LATEST_ALL)
+                return {row["city"]: dict(row) for row in result.mappings()}
+        except SQLAlchemyError as e:
+            logger.error(f"Database error retrieving latest weather for all cities: {e}")
+            return {}
+        except Exception as e:
+            logger.error(f"Unexpected error retrieving latest weather for all cities: {e}")
+            return {}
+
     async def cleanup_old_records(self, days: int = 7) -> bool:
         """
         Remove weather records older than specified days
@@ -160,16 +203,9 @@ class DatabaseService:
             bool: True if cleanup was successful, False otherwise
         """
         try:
-            async with self._transaction() as session:
-                query = text("""
-                    DELETE FROM weather_records
-                    WHERE recorded_at < NOW() - INTERVAL ':days days'
-                    RETURNING id
-                """)
-                
-                result = await session.execute(query, {"days": days})
-                deleted_count = len(result.fetchall())
-                logger.info(f"Cleaned up {deleted_count} old weather records")
+            async with self.get_session() as session:
+                result = await session.execute(_DELETE_OLD, {"days": days})
+                logger.info(f"Cleaned up {result.rowcount} old weather records")
                 return True
                 
         except SQLAlchemyError as e:
@@ -1,8 +1,7 @@
 from contextlib import asynccontextmanager
 import logging
 from typing import Optional, AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine, AsyncEngine
 from sqlalchemy.sql import text
 from telegram import Bot
 from telegram.ext import Application
@@ -12,31 +11,63 @@ logger = logging.getLogger(__name__)
 class AppLifecycle:
     def __init__(self):
         self.db_engine: Optional[AsyncEngine] = None
-        self.session_factory: Optional[sessionmaker[AsyncSession]] = None
+        self.session_factory: Optional[async_sessionmaker[AsyncSession]] = None
         self.bot_app: Optional[Application] = None
         self.is_running = False
 
     async def initialize_database(self, database_url: str):
         """Initialize database connection pool"""
         try:
+            # Make sure we go through asyncpg — a plain postgresql:// URL would
+            # fall back to the sync driver and defeat the async session model
+            if database_url.startswith("postgresql://"):
+                database_url = database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+            # Кэш prepared statement'ов — специфика asyncpg: другим
+            # драйверам (aiosqlite из docker-compose) эти аргументы
+            # неизвестны и роняют Connection() на старте
+            connect_args = {}
+            if database_url.startswith("postgresql+asyncpg://"):
+                connect_args = {
+                    "statement_cache_size": 1024,
+                    "prepared_statement_cache_size": 256
+                }
+
             self.db_engine = create_async_engine(
                 database_url,
+                pool_size=10,
+                max_overflow=20,
+                pool_timeout=10,
                 pool_pre_ping=True,  # Enable connection health checks
                 pool_recycle=3600,   # Recycle connections every hour
-                echo=False
+                echo=False,
+                connect_args=connect_args
             )
             
             # Create session factory
-            self.session_factory = sessionmaker(
-                bind=self.db_engine,
-                class_=AsyncSession,
+            self.session_factory = async_sessionmaker(
+                self.db_engine,
                 expire_on_commit=False
             )
             
             # Test the connection
             async with self.db_engine.connect() as conn:
                 await conn.execute(text("SELECT 1"))
-                
+
+            # Индекс под самый частый запрос: последняя запись по городу.
+            # Каноническое место — миграция 0002; здесь только подстраховка
+            # для давно развернутых баз, и на свежей БД без таблиц она
+            # не должна ронять старт
+            try:
+                async with self.db_engine.connect() as conn:
+                    await conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_weather_city_recorded "
+                        "ON weather_records (city, recorded_at DESC)"
+                    ))
+                    await conn.commit()
+            except Exception as e:
+                logger.warning(f"Skipping startup index creation: {e}")
+
             logger.info("Database connection initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
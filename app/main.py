@@ -1,10 +1,10 @@
 import asyncio
 import logging
 import os
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
@@ -12,8 +12,7 @@ from app.lifecycle import AppLifecycle
 from app.weather_service import WeatherService
 from app.database_service import DatabaseService
 from app.telegram_service import TelegramService
-from app.config import UPDATE_INTERVAL, MONITORED_CITIES, CITY_NAMES
-import pytz
+from app.config import UPDATE_INTERVAL, MONITORED_CITIES, CITY_NAMES, MONITORED_CITY_PAIRS, MOSCOW_TZ
 from datetime import datetime
 
 # Configure logging
@@ -28,6 +27,20 @@ load_dotenv()
 
 # Initialize templates and static files
 templates = Jinja2Templates(directory="templates")  # Используем корневой каталог templates
+# Шаблон один и горячий: отключаем auto_reload (stat файла на каждый рендер)
+# и достаем объект шаблона один раз при импорте
+templates.env.auto_reload = False
+INDEX_TEMPLATE = templates.env.get_template("index.html")
+
+class WeatherView(NamedTuple):
+    """Плоское представление погоды для шаблона вместо вложенных словарей"""
+    name: str
+    temp: float
+    humidity: int
+    description: str
+    wind_speed: float
+    country: str
+    recorded_at_moscow: datetime
 
 class WeatherBot:
     def __init__(self):
@@ -35,7 +48,6 @@ class WeatherBot:
         self.database_service: Optional[DatabaseService] = None
         self.weather_service: Optional[WeatherService] = None
         self.telegram_service: Optional[TelegramService] = None
-        self._stop_event = asyncio.Event()
 
     async def initialize(self) -> None:
         """Initialize all services"""
@@ -117,7 +129,6 @@ class WeatherBot:
     async def stop(self) -> None:
         """Stop all services"""
         try:
-            self._stop_event.set()
             if self.telegram_service:
                 await self.telegram_service.stop()
             if self.weather_service:
@@ -149,7 +160,8 @@ async def lifespan(app: FastAPI):
     logger.info("Application stopped successfully")
 
 # Create FastAPI app with lifespan
-app = FastAPI(lifespan=lifespan)
+# orjson сериализует JSON-ответы заметно быстрее стандартного json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 @app.get("/", response_class=HTMLResponse)
@@ -158,71 +170,71 @@ async def read_root(request: Request):
     # Получаем данные о погоде для всех отслеживаемых городов
     weather_list = []
     if bot.weather_service:
-        for city_id in MONITORED_CITIES:
-            try:
-                weather = await bot.weather_service.get_weather_by_city(city_id)
-                if weather:
-                    # Получаем текущее время в Москве
-                    moscow_tz = pytz.timezone('Europe/Moscow')
-                    current_time = datetime.now(moscow_tz)
-                    
-                    weather_list.append({
-                        "name": CITY_NAMES.get(city_id, city_id),
-                        "main": {
-                            "temp": weather.temperature,
-                            "humidity": weather.humidity
-                        },
-                        "weather": [{"description": weather.description}],
-                        "wind": {"speed": weather.wind_speed},
-                        "sys": {"country": "RU"},
-                        "recorded_at_moscow": current_time
-                    })
-            except Exception as e:
-                weather_list.append({"error": str(e)})
-
-    return templates.TemplateResponse(
-        "index.html",
-        {
-            "request": request,
-            "weather_list": weather_list,
-            "db_enabled": bot.database_service is not None
-        }
-    )
-
-@app.get("/weather")
+        # Текущее время в Москве одно для всех городов — вычисляем один раз
+        current_time = datetime.now(MOSCOW_TZ)
+        # Запрашиваем все города параллельно, чтобы не ждать каждый ответ по очереди
+        tasks = [bot.weather_service.get_weather_by_city(city_id) for city_id, _ in MONITORED_CITY_PAIRS]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for (city_id, ru_name), weather in zip(MONITORED_CITY_PAIRS, results):
+            if isinstance(weather, Exception):
+                weather_list.append({"error": str(weather)})
+            elif weather:
+                weather_list.append(WeatherView(
+                    name=ru_name,
+                    temp=weather.temperature,
+                    humidity=weather.humidity,
+                    description=weather.description,
+                    wind_speed=weather.wind_speed,
+                    country="RU",
+                    recorded_at_moscow=current_time
+                ))
+
+    return HTMLResponse(INDEX_TEMPLATE.render(
+        request=request,
+        weather_list=weather_list,
+        db_enabled=bot.database_service is not None
+    ))
+
+@app.get("/weather", response_class=ORJSONResponse)
 async def get_weather(cities: str = ""):
     """Get weather data for cities"""
     if not bot.weather_service:
         return {"error": "Weather service not initialized"}
         
-    city_list = [city.strip() for city in cities.split(",") if city.strip()]
+    # dict.fromkeys убирает дубликаты, сохраняя порядок — повторный город
+    # не должен стоить лишнего запроса к API
+    city_list = list(dict.fromkeys(city.strip() for city in cities.split(",") if city.strip()))
     if not city_list:
         return {"error": "No cities provided"}
+    if len(city_list) > 20:
+        return {"error": "Too many cities requested (max 20)"}
         
+    # Запрашиваем все города параллельно, чтобы не ждать каждый ответ по очереди
+    tasks = [bot.weather_service.get_weather_by_city(city) for city in city_list]
+    weather_results = await asyncio.gather(*tasks, return_exceptions=True)
+
     results = []
-    for city in city_list:
-        try:
-            weather = await bot.weather_service.get_weather_by_city(city)
-            if weather:
-                results.append({
-                    "city": city,
-                    "temperature": weather.temperature,
-                    "feels_like": weather.feels_like,
-                    "humidity": weather.humidity,
-                    "wind_speed": weather.wind_speed,
-                    "description": weather.description
-                })
-            else:
-                results.append({
-                    "city": city,
-                    "error": "Failed to get weather data"
-                })
-        except Exception as e:
+    for city, weather in zip(city_list, weather_results):
+        if isinstance(weather, Exception):
             results.append({
                 "city": city,
-                "error": str(e)
+                "error": str(weather)
             })
-            
+        elif weather:
+            results.append({
+                "city": city,
+                "temperature": weather.temperature,
+                "feels_like": weather.feels_like,
+                "humidity": weather.humidity,
+                "wind_speed": weather.wind_speed,
+                "description": weather.description
+            })
+        else:
+            results.append({
+                "city": city,
+                "error": "Failed to get weather data"
+            })
+
     return {"results": results}
 
 @app.get("/health")
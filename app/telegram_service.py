@@ -1,28 +1,61 @@
 import logging
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Set, Tuple
 from telegram import Update
+from telegram.error import Forbidden, RetryAfter
 from telegram.ext import Application, CommandHandler, ContextTypes
 from .weather_service import WeatherService, WeatherData
-from .config import MONITORED_CITIES, NOTIFICATION_SETTINGS, CITY_COMMANDS, CITY_NAMES
+from .config import (
+    MONITORED_CITIES, NOTIFICATION_SETTINGS, CITY_COMMANDS, CITY_NAMES, MOSCOW_TZ,
+    WEBHOOK_URL, WEBHOOK_PORT, WEBHOOK_PATH
+)
 import asyncio
-import pytz
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Команды вида /weather_<город> и соответствующие им города
+CITY_CMD_MAP: Dict[str, str] = {
+    "weather_moscow": "Moscow",
+    "weather_spb": "Saint Petersburg",
+    "weather_pskov": "Pskov",
+    "weather_belgrade": "Belgrade"
+}
+
 class TelegramService:
     def __init__(self, token: str, weather_service: WeatherService):
         self.token = token
         self.weather_service = weather_service
         self.app: Optional[Application] = None
-        self.subscribed_chats: List[int] = []
+        self.subscribed_chats: Set[int] = set()
         self._running = False
-        self.moscow_tz = pytz.timezone('Europe/Moscow')
+        # Ограничиваем параллельную рассылку чуть ниже глобального лимита
+        # Telegram (~30 сообщений в секунду)
+        self._send_sem = asyncio.Semaphore(25)
+        # Плоский словарь алиас -> город, чтобы резолвить аргумент /weather
+        # одним hash-lookup вместо линейного перебора CITY_COMMANDS
+        self._city_alias_map: Dict[str, str] = {
+            **{cmd.lower(): city_id for cmd, city_id in CITY_COMMANDS.items()},
+            **{name.lower(): city_id for city_id, name in CITY_NAMES.items()},
+            **{city_id.lower(): city_id for city_id in MONITORED_CITIES}
+        }
+        # Формат времени меняется раз в секунду — кэшируем строку по секунде
+        self._time_cache: Tuple[int, str] = (0, "")
+        # Общая пауза после 429: один RetryAfter тормозит всю рассылку,
+        # иначе остальные отправки только продлевают бан
+        self._pause_until: float = 0.0
+        # Подпись последней рассылки: если погода не изменилась с прошлого
+        # цикла, повторное сообщение подписчикам не отправляем
+        self._last_broadcast_sig: Optional[Tuple] = None
 
     def _get_moscow_time(self) -> str:
-        """Get current Moscow time formatted as string"""
-        now = datetime.now(self.moscow_tz)
-        return now.strftime("%d.%m.%Y %H:%M:%S")
+        """Get current Moscow time formatted as string (memoized per second)"""
+        sec = int(time.time())
+        if sec == self._time_cache[0]:
+            return self._time_cache[1]
+        formatted = datetime.fromtimestamp(sec, MOSCOW_TZ).strftime("%d.%m.%Y %H:%M:%S")
+        self._time_cache = (sec, formatted)
+        return formatted
         
     async def initialize(self) -> None:
         """Initialize the bot application"""
@@ -37,12 +70,11 @@ class TelegramService:
                 self.app.add_handler(CommandHandler("unsubscribe", self._unsubscribe_command))
                 self.app.add_handler(CommandHandler("cities", self._cities_command))
                 
-                # Добавляем обработчики для каждого города
-                self.app.add_handler(CommandHandler("weather_moscow", self._weather_moscow_command))
-                self.app.add_handler(CommandHandler("weather_spb", self._weather_spb_command))
-                self.app.add_handler(CommandHandler("weather_pskov", self._weather_pskov_command))
-                self.app.add_handler(CommandHandler("weather_belgrade", self._weather_belgrade_command))
-                
+                # Один обработчик на все команды /weather_<город> — PTB
+                # прогоняет каждый update через цепочку handler'ов, так что
+                # чем она короче, тем дешевле диспетчеризация
+                self.app.add_handler(CommandHandler(list(CITY_CMD_MAP.keys()), self._weather_city_command))
+
                 logger.info("Telegram bot initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Telegram bot: {e}")
@@ -64,13 +96,25 @@ class TelegramService:
                 # Start the bot in non-blocking mode
                 await self.app.initialize()
                 await self.app.start()
-                # Use the correct polling method with type guard
                 if self.app.updater:  # Type guard
-                    await self.app.updater.start_polling(
-                        allowed_updates=Update.ALL_TYPES,
-                        drop_pending_updates=True
-                    )
-                    logger.info("Telegram bot polling started successfully")
+                    if WEBHOOK_URL:
+                        # Telegram пушит обновления сам — без постоянного getUpdates
+                        await self.app.updater.start_webhook(
+                            listen="0.0.0.0",
+                            port=WEBHOOK_PORT,
+                            url_path=WEBHOOK_PATH,
+                            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+                            allowed_updates=["message"],
+                            drop_pending_updates=True
+                        )
+                        logger.info("Telegram bot webhook started successfully")
+                    else:
+                        # Fallback на long polling, когда вебхук не настроен
+                        await self.app.updater.start_polling(
+                            allowed_updates=["message"],
+                            drop_pending_updates=True
+                        )
+                        logger.info("Telegram bot polling started successfully")
                 else:
                     raise RuntimeError("Telegram bot updater not initialized")
         except Exception as e:
@@ -146,7 +190,7 @@ class TelegramService:
             chat_id = update.message.chat.id
             logger.info(f"Received /subscribe command from chat_id: {chat_id}")
             if chat_id not in self.subscribed_chats:
-                self.subscribed_chats.append(chat_id)
+                self.subscribed_chats.add(chat_id)
                 logger.info(f"Chat {chat_id} subscribed to weather updates. Total subscribers: {len(self.subscribed_chats)}")
                 await update.message.reply_text(
                     "✅ Вы подписались на обновления погоды"
@@ -181,38 +225,23 @@ class TelegramService:
             
         try:
             if not context.args:
-                # Если город не указан, показываем погоду во всех отслеживаемых городах
+                # Если город не указан, показываем погоду во всех отслеживаемых
+                # городах; текст отчета уже собран в update_all_cities
                 weather_updates = await self.weather_service.update_all_cities()
+                report = self.weather_service.get_cached_report()
+                if not isinstance(report, str):
+                    report = WeatherService._render_report(weather_updates)
                 moscow_time = self._get_moscow_time()
-                response = f"🌤 Текущая погода (МСК: {moscow_time}):\n\n"
-                
-                for city_id, weather in weather_updates:
-                    city_name = CITY_NAMES.get(city_id, city_id)
-                    if weather:
-                        response += (
-                            f"📍 {city_name}:\n"
-                            f"🌡 Температура: {weather.temperature}°C\n"
-                            f"🌡 Ощущается как: {weather.feels_like}°C\n"
-                            f"💧 Влажность: {weather.humidity}%\n"
-                            f"💨 Скорость ветра: {weather.wind_speed} м/с\n"
-                            f"📝 {weather.description.capitalize()}\n\n"
-                        )
-                    else:
-                        response += f"❌ Не удалось получить данные для {city_name}\n\n"
-                        
+                response = f"🌤 Текущая погода (МСК: {moscow_time}):\n\n{report}"
+
                 await update.message.reply_text(response)
                 return
 
             # Получаем погоду для конкретного города
             city = " ".join(context.args).lower()
-            
-            # Проверяем, есть ли город в списке команд
-            city_id = None
-            for cmd, cmd_city_id in CITY_COMMANDS.items():
-                if city in cmd.lower():
-                    city_id = cmd_city_id
-                    break
-            
+
+            city_id = self._city_alias_map.get(city)
+
             if not city_id:
                 await update.message.reply_text(
                     "❌ Город не найден. Используйте команды:\n"
@@ -249,36 +278,81 @@ class TelegramService:
                 "❌ Произошла ошибка при получении данных о погоде"
             )
 
+    async def _send_one(self, chat_id: int, message: str) -> None:
+        """Send one message under the rate-limit semaphore, honoring 429s"""
+        async with self._send_sem:
+            wait = self._pause_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.app.bot.send_message(chat_id=chat_id, text=message)
+            except RetryAfter as e:
+                # Глобальная пауза: остальные отправители тоже должны подождать
+                self._pause_until = max(self._pause_until, time.monotonic() + e.retry_after + 0.5)
+                logger.warning(f"Rate limited by Telegram, retrying chat {chat_id} in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+                await self.app.bot.send_message(chat_id=chat_id, text=message)
+            except Forbidden:
+                # Пользователь заблокировал бота — больше не тратим на него запросы
+                logger.info(f"Chat {chat_id} blocked the bot, unsubscribing it")
+                self.subscribed_chats.discard(chat_id)
+
+    async def _broadcast(self, message: str) -> None:
+        """Send a message to all subscribed chats concurrently"""
+        if not self.app:
+            return
+        # Снимок списка: _send_one может отписывать заблокировавшие чаты на ходу
+        chats = list(self.subscribed_chats)
+        results = await asyncio.gather(
+            *[self._send_one(chat_id, message) for chat_id in chats],
+            return_exceptions=True
+        )
+        for chat_id, result in zip(chats, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send update to chat {chat_id}: {result}")
+
+    @staticmethod
+    def _broadcast_signature(weather_updates: List[tuple[str, Optional[WeatherData]]]) -> Optional[Tuple]:
+        """Build a comparable fingerprint of a broadcast payload
+
+        Returns None when the payload cannot be fingerprinted — the caller
+        then broadcasts unconditionally.
+        """
+        try:
+            return tuple(
+                (city_id, round(w.temperature, 1), round(w.feels_like, 1),
+                 w.humidity, round(w.wind_speed, 1), w.description)
+                if w else (city_id, None)
+                for city_id, w in weather_updates
+            )
+        except (TypeError, AttributeError):
+            return None
+
     async def send_weather_updates(self, weather_updates: List[tuple[str, Optional[WeatherData]]]) -> None:
         """Send weather updates to subscribed users"""
         if not self.subscribed_chats:
             return
-            
+
         try:
+            # Если все поля совпадают с прошлой рассылкой, подписчики уже
+            # видели эти данные — не тратим запросы к Telegram на дубликат.
+            # Резкие изменения уходят отдельным путем через send_weather_alert.
+            sig = self._broadcast_signature(weather_updates)
+            if sig is not None and sig == self._last_broadcast_sig:
+                logger.info("Weather unchanged since last broadcast, skipping update")
+                return
+            self._last_broadcast_sig = sig
+
+            # Рассылка идет сразу после цикла обновления — используем отчет,
+            # отрендеренный там, вместо повторной сборки той же строки
+            report = self.weather_service.get_cached_report()
+            if not isinstance(report, str):
+                report = WeatherService._render_report(weather_updates)
             moscow_time = self._get_moscow_time()
-            message = f"🌤 Обновление погоды (МСК: {moscow_time}):\n\n"
-            
-            for city_id, weather in weather_updates:
-                city_name = CITY_NAMES.get(city_id, city_id)
-                if weather:
-                    message += (
-                        f"📍 {city_name}:\n"
-                        f"🌡 Температура: {weather.temperature}°C\n"
-                        f"🌡 Ощущается как: {weather.feels_like}°C\n"
-                        f"💧 Влажность: {weather.humidity}%\n"
-                        f"💨 Скорость ветра: {weather.wind_speed} м/с\n"
-                        f"📝 {weather.description.capitalize()}\n\n"
-                    )
-                else:
-                    message += f"❌ Не удалось получить данные для {city_name}\n\n"
-            
-            if self.app:
-                for chat_id in self.subscribed_chats:
-                    try:
-                        await self.app.bot.send_message(chat_id=chat_id, text=message)
-                    except Exception as e:
-                        logger.error(f"Failed to send update to chat {chat_id}: {e}")
-                        
+            message = f"🌤 Обновление погоды (МСК: {moscow_time}):\n\n{report}"
+
+            await self._broadcast(message)
+
         except Exception as e:
             logger.error(f"Error sending weather updates: {e}")
 
@@ -296,13 +370,8 @@ class TelegramService:
                 f"Сообщение: {message}"
             )
             
-            if self.app:
-                for chat_id in self.subscribed_chats:
-                    try:
-                        await self.app.bot.send_message(chat_id=chat_id, text=alert_message)
-                    except Exception as e:
-                        logger.error(f"Failed to send alert to chat {chat_id}: {e}")
-                        
+            await self._broadcast(alert_message)
+
         except Exception as e:
             logger.error(f"Error sending weather alert: {e}")
 
@@ -336,26 +405,11 @@ class TelegramService:
                 "❌ Произошла ошибка при получении данных о погоде"
             )
 
-    async def _weather_moscow_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /weather_moscow command"""
-        if update.message:  # Type guard
-            logger.info("Received /weather_moscow command from chat_id: %s", update.message.chat.id)
-            await self._get_city_weather("Moscow", update)
-
-    async def _weather_spb_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /weather_spb command"""
-        if update.message:  # Type guard
-            logger.info("Received /weather_spb command from chat_id: %s", update.message.chat.id)
-            await self._get_city_weather("Saint Petersburg", update)
-
-    async def _weather_pskov_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /weather_pskov command"""
-        if update.message:  # Type guard
-            logger.info("Received /weather_pskov command from chat_id: %s", update.message.chat.id)
-            await self._get_city_weather("Pskov", update)
-
-    async def _weather_belgrade_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /weather_belgrade command"""
-        if update.message:  # Type guard
-            logger.info("Received /weather_belgrade command from chat_id: %s", update.message.chat.id)
-            await self._get_city_weather("Belgrade", update) 
\ No newline at end of file
+    async def _weather_city_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /weather_<city> commands via a single dispatcher"""
+        if update.message and update.message.text:  # Type guard
+            cmd = update.message.text[1:].split("@")[0].split()[0]
+            logger.info("Received /%s command from chat_id: %s", cmd, update.message.chat.id)
+            city_id = CITY_CMD_MAP.get(cmd)
+            if city_id:
+                await self._get_city_weather(city_id, update) 
\ No newline at end of file
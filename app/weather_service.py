@@ -1,26 +1,30 @@
 import logging
+from dataclasses import dataclass
 from typing import Optional, Dict, Any, List, Tuple
 import httpx
-from pydantic import BaseModel
 import os
 from datetime import datetime, timedelta
-import pytz
 import asyncio
+import orjson
 from dotenv import load_dotenv
 from .database_service import DatabaseService
-from .config import MONITORED_CITIES, UPDATE_INTERVAL, ALERT_THRESHOLDS, CITY_NAMES
+from .config import MONITORED_CITIES, UPDATE_INTERVAL, ALERT_THRESHOLDS, CITY_NAMES, UTC
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class WeatherData(BaseModel):
+# DTO для доверенных данных: обычный dataclass со слотами вместо Pydantic —
+# конструирование сводится к присваиванию атрибутов без пайплайна валидации
+@dataclass(slots=True)
+class WeatherData:
     temperature: float
     feels_like: float
     humidity: int
     description: str
     wind_speed: float
     last_update: Optional[datetime] = None
+    timezone: str = ""
 
 class WeatherService:
     def __init__(self, api_key: str, database_service: Optional[DatabaseService] = None):
@@ -30,13 +34,68 @@ class WeatherService:
         self._update_task: Optional[asyncio.Task] = None
         self._last_weather_data: Dict[str, WeatherData] = {}
         self._cache_duration = timedelta(minutes=30)
-        self._http_client = httpx.AsyncClient(timeout=30.0)  # Создаем один клиент для всего сервиса
+        # Готовый текст отчета по всем городам, собранный один раз за цикл
+        self._last_report_text: Optional[str] = None
+        self._last_report_time: Optional[datetime] = None
+        # Запросы к API, которые сейчас в полете, по городам
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # ETag последнего ответа по городам: сервер отвечает 304 без тела,
+        # если данные не изменились с прошлого запроса
+        self._etags: Dict[str, str] = {}
+        # Один клиент на весь сервис: HTTP/2 мультиплексирует параллельные
+        # запросы по одному TLS-соединению, keepalive экономит handshake'и
+        self._http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_keepalive_connections=20,
+                max_connections=20,
+                keepalive_expiry=60.0
+            ),
+            headers={"Accept-Encoding": "gzip"}
+        )
         logger.info(f"WeatherService initialized with API key: {api_key[:5]}...")
         
     async def initialize(self) -> None:
         """Initialize the service and start updates"""
+        await self._warm_cache_from_db()
         await self.start_updates()
         logger.info("Weather service initialized and updates started")
+
+    async def _warm_cache_from_db(self) -> None:
+        """Seed the in-memory cache from the freshest DB records
+
+        Without this every restart re-fetches all cities from OpenWeather
+        even when the stored data is minutes old.
+        """
+        if not self.database_service:
+            return
+        try:
+            latest = await self.database_service.get_latest_all()
+            if not latest:
+                return
+            # В БД города лежат под отображаемыми именами — строим обратный маппинг
+            name_to_id = {name: city_id for city_id, name in CITY_NAMES.items()}
+            now_utc = datetime.utcnow()
+            for stored_name, record in latest.items():
+                city_id = name_to_id.get(stored_name, stored_name)
+                recorded_at = record["recorded_at"]
+                if recorded_at.tzinfo is not None:
+                    recorded_at = recorded_at.astimezone(UTC).replace(tzinfo=None)
+                age = now_utc - recorded_at
+                if age >= self._cache_duration:
+                    continue
+                self._last_weather_data[city_id] = WeatherData(
+                    temperature=record["temperature"],
+                    feels_like=record["temperature"],  # Приближение: feels_like не хранится
+                    humidity=record["humidity"],
+                    description=record["description"],
+                    wind_speed=record["wind_speed"],
+                    last_update=datetime.now() - age
+                )
+            logger.info(f"Warmed weather cache from database for {len(self._last_weather_data)} cities")
+        except Exception as e:
+            logger.error(f"Failed to warm weather cache from database: {e}")
         
     async def stop(self) -> None:
         """Stop the service and cleanup resources"""
@@ -63,10 +122,20 @@ class WeatherService:
         
     async def _update_loop(self):
         """Periodic weather update loop"""
+        # Дедлайны считаем по монотонным часам цикла: длительность самого
+        # обновления не сдвигает расписание, а пропущенные тики не копятся
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
         while True:
             try:
                 await self.update_all_cities(force_update=True)
-                await asyncio.sleep(UPDATE_INTERVAL)
+                next_tick += UPDATE_INTERVAL
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    # Цикл занял дольше интервала — начинаем отсчет заново
+                    next_tick = loop.time()
+                    continue
+                await asyncio.sleep(delay)
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -89,27 +158,88 @@ class WeatherService:
         Returns:
             List[Tuple[str, Optional[WeatherData]]]: List of (city_id, weather_data) pairs
         """
-        weather_updates = []
-        
+        # Сначала раскладываем города на кэш-попадания и промахи,
+        # затем запрашиваем все промахи параллельно одним gather
+        results: Dict[str, Optional[WeatherData]] = {}
+        misses: List[str] = []
+
         for city_id in MONITORED_CITIES:
-            # Check memory cache first
             cached_data = self._last_weather_data.get(city_id)
             if not force_update and self._is_cache_valid(cached_data):
-                weather_updates.append((city_id, cached_data))
-                continue
-                
+                results[city_id] = cached_data
+            else:
+                misses.append(city_id)
+
+        fetched_cities: List[str] = []
+        if misses:
+            # force_update пробрасывается дальше, иначе get_weather_by_city
+            # ответит из собственного кэша и принудительное обновление
+            # выродится в вечное продление старых данных
+            prev = {city_id: self._last_weather_data.get(city_id) for city_id in misses}
+            tasks = [self.get_weather_by_city(city_id, force_update=force_update) for city_id in misses]
+            fetched = await asyncio.gather(*tasks, return_exceptions=True)
+            for city_id, weather_data in zip(misses, fetched):
+                if isinstance(weather_data, Exception):
+                    logger.error(f"Failed to update weather for {CITY_NAMES.get(city_id, city_id)}: {weather_data}")
+                    results[city_id] = None
+                    continue
+                try:
+                    if weather_data:
+                        self._last_weather_data[city_id] = weather_data
+                        self._check_weather_alerts(city_id, weather_data)
+                        # В батч записи идут только реально перезапрошенные
+                        # данные: кэш-хит и 304 возвращают прежний объект,
+                        # и повторная вставка со свежим NOW() им не нужна
+                        if weather_data is not prev[city_id]:
+                            fetched_cities.append(city_id)
+                    results[city_id] = weather_data
+                except Exception as e:
+                    logger.error(f"Failed to update weather for {CITY_NAMES.get(city_id, city_id)}: {e}")
+                    results[city_id] = None
+
+        # Сохраняем все свежие данные одним батчем вместо INSERT на город
+        if self.database_service and fetched_cities:
             try:
-                weather_data = await self.get_weather_by_city(city_id)
-                if weather_data:
-                    weather_data.last_update = datetime.now()
-                    self._last_weather_data[city_id] = weather_data
-                    self._check_weather_alerts(city_id, weather_data)
-                weather_updates.append((city_id, weather_data))
+                records = [{
+                    "city": CITY_NAMES.get(city_id, city_id),
+                    "temp": results[city_id].temperature,
+                    "humidity": results[city_id].humidity,
+                    "wind": results[city_id].wind_speed,
+                    "descr": results[city_id].description,
+                    "tz": results[city_id].timezone
+                } for city_id in fetched_cities]
+                await self.database_service.save_weather_records_batch(records)
             except Exception as e:
-                logger.error(f"Failed to update weather for {CITY_NAMES.get(city_id, city_id)}: {e}")
-                weather_updates.append((city_id, None))
-                    
+                logger.error(f"Failed to save weather data batch to database: {e}")
+
+        # Отдаем в исходном порядке городов
+        weather_updates = [(city_id, results[city_id]) for city_id in MONITORED_CITIES]
+        self._last_report_text = self._render_report(weather_updates)
+        self._last_report_time = datetime.now()
         return weather_updates
+
+    @staticmethod
+    def _render_report(weather_updates: List[Tuple[str, Optional["WeatherData"]]]) -> str:
+        """Render the per-city report block shared by broadcasts and /weather"""
+        lines = []
+        for city_id, weather in weather_updates:
+            city_name = CITY_NAMES.get(city_id, city_id)
+            if weather:
+                lines.append(
+                    f"📍 {city_name}:\n"
+                    f"🌡 Температура: {weather.temperature}°C\n"
+                    f"🌡 Ощущается как: {weather.feels_like}°C\n"
+                    f"💧 Влажность: {weather.humidity}%\n"
+                    f"💨 Скорость ветра: {weather.wind_speed} м/с\n"
+                    f"📝 {weather.description.capitalize()}\n"
+                )
+            else:
+                lines.append(f"❌ Не удалось получить данные для {city_name}\n")
+        return "\n".join(lines)
+
+    def get_cached_report(self) -> Optional[str]:
+        """Return the report rendered during the last update cycle"""
+        return self._last_report_text
         
     def _check_weather_alerts(self, city_id: str, new_data: WeatherData):
         """Check for significant weather changes and log alerts"""
@@ -142,7 +272,7 @@ class WeatherService:
         """
         try:
             logger.info(f"Getting weather for city: {city_id}")
-            
+
             # Проверяем кэш
             if not force_update:
                 cached_data = self._last_weather_data.get(city_id)
@@ -150,63 +280,92 @@ class WeatherService:
                     logger.info(f"Returning cached data for city: {city_id}")
                     return cached_data
 
-            # Подготавливаем параметры запроса
-            params = {
-                "q": CITY_NAMES.get(city_id, city_id),  # Используем название города
-                "appid": self.api_key,
-                "units": units
-            }
-            
-            url = f"{self.base_url}/weather"
-            city_name = CITY_NAMES.get(city_id, city_id)
-            logger.info(f"Making request to OpenWeather API for {city_name}")
-            
+            # Single-flight: параллельные запросы одного города разделяют
+            # один запрос к API вместо дублирующих
+            inflight = self._inflight.get(city_id)
+            if inflight is not None:
+                return await inflight
+
+            fut: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._inflight[city_id] = fut
             try:
+                weather_data = await self._fetch_weather(city_id, units)
+                fut.set_result(weather_data)
+                return weather_data
+            finally:
+                del self._inflight[city_id]
+                if not fut.done():
+                    fut.set_result(None)
+
+        except Exception as e:
+            logger.error(f"Unexpected error getting weather for {city_id}: {e}")
+            logger.exception(e)
+            return None
+
+    async def _fetch_weather(self, city_id: str, units: str) -> Optional[WeatherData]:
+        """Fetch weather from the OpenWeather API and update the cache"""
+        # Подготавливаем параметры запроса
+        params = {
+            "q": CITY_NAMES.get(city_id, city_id),  # Используем название города
+            "appid": self.api_key,
+            "units": units
+        }
+
+        url = f"{self.base_url}/weather"
+        city_name = CITY_NAMES.get(city_id, city_id)
+        logger.info(f"Making request to OpenWeather API for {city_name}")
+
+        # Условный GET: при неизменившихся данных сервер вернет 304 без тела
+        headers = {}
+        etag = self._etags.get(city_id)
+        if etag:
+            headers["If-None-Match"] = etag
+
+        try:
+            response = await self._http_client.get(url, params=params, headers=headers)
+
+            if response.status_code == 304:
+                cached_data = self._last_weather_data.get(city_id)
+                if cached_data:
+                    logger.info(f"Weather for {city_name} not modified, reusing cached data")
+                    cached_data.last_update = datetime.now()
+                    return cached_data
+                # Кэш потерян (например, после рестарта) — повторяем без ETag
+                del self._etags[city_id]
                 response = await self._http_client.get(url, params=params)
-                
-                if response.status_code != 200:
-                    logger.error(f"HTTP error fetching weather for {city_name}: {response.text}")
-                    return None
-                    
-                data = response.json()
-                logger.info(f"Successfully received weather data for {city_name}")
-
-                weather_data = WeatherData(
-                    temperature=data["main"]["temp"],
-                    feels_like=data["main"]["feels_like"],
-                    humidity=data["main"]["humidity"],
-                    description=data["weather"][0]["description"],
-                    wind_speed=data["wind"]["speed"],
-                    last_update=datetime.now()
-                )
 
-                self._last_weather_data[city_id] = weather_data
-                
-                # Save to database if available
-                if self.database_service:
-                    try:
-                        await self.database_service.save_weather_data(
-                            city=city_name,
-                            temperature=weather_data.temperature,
-                            humidity=weather_data.humidity,
-                            wind_speed=weather_data.wind_speed,
-                            description=weather_data.description,
-                            timezone=str(data.get("timezone", ""))
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to save weather data to database for {city_name}: {e}")
-                
-                return weather_data
-                
-            except httpx.HTTPError as e:
-                logger.error(f"HTTP error fetching weather for {city_name}: {e}")
-                return None
-            except Exception as e:
-                logger.error(f"Error processing weather data for {city_name}: {e}")
-                logger.exception(e)
+            if response.status_code != 200:
+                logger.error(f"HTTP error fetching weather for {city_name}: {response.text}")
                 return None
 
+            response_etag = response.headers.get("ETag")
+            if response_etag:
+                self._etags[city_id] = response_etag
+
+            # orjson парсит тело заметно быстрее stdlib json
+            data = orjson.loads(response.content)
+            logger.info(f"Successfully received weather data for {city_name}")
+
+            weather_data = WeatherData(
+                temperature=data["main"]["temp"],
+                feels_like=data["main"]["feels_like"],
+                humidity=data["main"]["humidity"],
+                description=data["weather"][0]["description"],
+                wind_speed=data["wind"]["speed"],
+                last_update=datetime.now(),
+                timezone=str(data.get("timezone", ""))
+            )
+
+            self._last_weather_data[city_id] = weather_data
+
+            # Запись в БД батчится в update_all_cities — один INSERT
+            # на весь цикл вместо отдельной транзакции на каждый город
+            return weather_data
+
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error fetching weather for {city_name}: {e}")
+            return None
         except Exception as e:
-            logger.error(f"Unexpected error getting weather for {city_id}: {e}")
+            logger.error(f"Error processing weather data for {city_name}: {e}")
             logger.exception(e)
             return None 
\ No newline at end of file
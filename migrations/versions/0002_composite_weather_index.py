@@ -0,0 +1,38 @@
+"""Composite index on (city, recorded_at DESC)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-08-30 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Composite index serves "latest record per city" queries
+    # (WHERE city = ? ORDER BY recorded_at DESC LIMIT 1) with a single
+    # index seek instead of a two-index merge plus sort.
+    # Name matches the startup fallback in app.lifecycle.
+    op.create_index(
+        'ix_weather_city_recorded',
+        'weather_records',
+        ['city', sa.text('recorded_at DESC')],
+        if_not_exists=True
+    )
+
+    # Standalone city index is now redundant: the composite index covers
+    # every city-only lookup via its leading column.
+    op.drop_index('ix_weather_records_city', table_name='weather_records')
+
+
+def downgrade() -> None:
+    op.create_index('ix_weather_records_city', 'weather_records', ['city'])
+    op.drop_index('ix_weather_city_recorded', table_name='weather_records')
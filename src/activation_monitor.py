@@ -1,67 +1,118 @@
-import requests
-import time
-from datetime import datetime
+import argparse
+import asyncio
+import logging
+import random
+import aiohttp
 import os
 from dotenv import load_dotenv
 
-def check_api_status():
-    load_dotenv()
+# Время в сообщениях подставляет logging через %(asctime)s — strftime
+# выполняется только если запись действительно выводится
+logger = logging.getLogger(__name__)
+
+# Параметры экспоненциального backoff: начинаем с минуты и растягиваем
+# интервал в полтора раза за попытку, но не дольше 15 минут
+BACKOFF_BASE = 60
+BACKOFF_RATE = 1.5
+BACKOFF_MAX = 900
+
+async def check_api_status(session, city='London'):
     api_key = os.getenv('OPENWEATHER_API_KEY', '')
-    
+
     # Правильный URL для бесплатного API
     base_url = "api.openweathermap.org/data/2.5/weather"
     url = f"http://{base_url}"
-    
+
     params = {
-        'q': 'London',
+        'q': city,
         'appid': api_key,
         'units': 'metric'
     }
-    
+
     try:
-        response = requests.get(url, params=params)
-        current_time = datetime.now().strftime('%H:%M:%S')
-        
-        if response.status_code == 200:
-            print(f"✅ [{current_time}] API ключ активен! Получен успешный ответ.")
-            print("\nПример данных:")
-            data = response.json()
-            print(f"Город: {data.get('name')}")
-            print(f"Температура: {data.get('main', {}).get('temp')}°C")
-            return True
-        else:
-            print(f"❌ [{current_time}] API ключ еще не активен (Статус: {response.status_code})")
-            print(f"Ответ сервера: {response.text}")
-            return False
-            
+        async with session.get(url, params=params,
+                               timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status == 200:
+                logger.info("✅ API ключ активен! Получен успешный ответ.")
+                data = await response.json()
+                logger.info("Город: %s, температура: %s°C",
+                            data.get('name'), data.get('main', {}).get('temp'))
+                return True, None
+            else:
+                logger.info("❌ API ключ еще не активен (Статус: %s)", response.status)
+                logger.info("Ответ сервера: %s", await response.text())
+                # При 429 сервер сам говорит, сколько ждать
+                retry_after = response.headers.get('Retry-After')
+                return False, float(retry_after) if retry_after else None
+
     except Exception as e:
-        print(f"❌ [{current_time}] Ошибка при проверке: {str(e)}")
-        return False
+        logger.error("❌ Ошибка при проверке: %s", e)
+        return False, None
 
-def monitor_activation(check_interval=300):  # 300 секунд = 5 минут
+async def monitor_activation(max_attempts=None, cities=('London',)):
+    load_dotenv()
     print("\nЗапуск мониторинга активации API ключа")
     print("=" * 50)
-    print("Проверка будет выполняться каждые 5 минут")
+    print("Интервал проверки растет экспоненциально (1-15 минут)")
     print("Для остановки нажмите Ctrl+C")
     print("=" * 50)
-    
-    attempt = 1
-    
+
+    attempt = 0
+
+    # Один ClientSession на весь мониторинг: keepalive держит соединение
+    # открытым между опросами, а несколько городов проверяются параллельно
+    connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=600)
     try:
-        while True:
-            print(f"\nПопытка #{attempt}")
-            if check_api_status():
-                print("\n✨ API ключ успешно активирован!")
-                break
-                
-            print(f"Следующая проверка через {check_interval // 60} минут...")
-            time.sleep(check_interval)
-            attempt += 1
-            
-    except KeyboardInterrupt:
-        print("\n\nМониторинг остановлен пользователем")
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while True:
+                print(f"\nПопытка #{attempt + 1}")
+                results = await asyncio.gather(
+                    *[check_api_status(session, city) for city in cities],
+                    return_exceptions=True
+                )
+                if any(result[0] is True for result in results
+                       if isinstance(result, tuple)):
+                    print("\n✨ API ключ успешно активирован!")
+                    break
+
+                attempt += 1
+                if max_attempts is not None and attempt >= max_attempts:
+                    print(f"\nДостигнут лимит попыток ({max_attempts}), выходим")
+                    break
+
+                # Экспоненциальный backoff с джиттером: свежевыданный ключ
+                # активируется часами, частый опрос только тратит запросы.
+                # Джиттер разносит опросы, если запущено несколько мониторов
+                retry_after = max(
+                    (result[1] for result in results
+                     if isinstance(result, tuple) and result[1]),
+                    default=None
+                )
+                if retry_after:
+                    interval = retry_after
+                else:
+                    interval = min(BACKOFF_MAX, BACKOFF_BASE * BACKOFF_RATE ** attempt)
+                    interval *= random.uniform(0.8, 1.2)
+
+                print(f"Следующая проверка через {interval / 60:.1f} минут...")
+                await asyncio.sleep(interval)
+
     except Exception as e:
         print(f"\n\nОшибка в процессе мониторинга: {str(e)}")
 
 if __name__ == "__main__":
-    monitor_activation() 
\ No newline at end of file
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description="Мониторинг активации API ключа OpenWeather")
+    parser.add_argument('--max-attempts', type=int, default=None,
+                        help="Остановиться после N неудачных попыток (по умолчанию — без лимита)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(monitor_activation(max_attempts=args.max_attempts))
+    except KeyboardInterrupt:
+        # Ctrl+C отменяет задачу и всплывает из asyncio.run —
+        # внутри корутины его уже не поймать
+        print("\n\nМониторинг остановлен пользователем")
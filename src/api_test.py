@@ -1,6 +1,23 @@
 import os
-import requests
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = str(Path(__file__).parent.parent)
+sys.path.insert(0, project_root)
+
+import httpx
 from dotenv import load_dotenv
+from src.env_validation import validate_api_key
+
+# httpx вместо requests: TCP_NODELAY включен по умолчанию (без задержек
+# Nagle на мелких запросах), а HTTP/2 мультиплексирует повторные запросы
+# по одному соединению
+_client = httpx.Client(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_keepalive_connections=4)
+)
 
 def check_env_format():
     # Load environment variables
@@ -11,19 +28,15 @@ def check_env_format():
     print("\nПроверка переменных окружения:")
     print("=" * 50)
     
-    # Проверка API ключа
+    # Проверка API ключа — общий валидатор вместо дублирующих проверок
     print("\n1. Проверка API ключа:")
     print(f"Значение: {api_key}")
-    if api_key.strip() != api_key:
-        print("❌ Ошибка: API ключ содержит пробелы в начале или конце")
-    if '"' in api_key or "'" in api_key:
-        print("❌ Ошибка: API ключ содержит кавычки")
-    if '#' in api_key:
-        print("❌ Ошибка: API ключ содержит символ комментария")
-    if len(api_key) == 32:
-        print("✅ Длина API ключа корректная (32 символа)")
+    issues = validate_api_key(api_key)
+    if issues:
+        for issue in issues:
+            print(f"❌ Ошибка: {issue}")
     else:
-        print(f"❌ Ошибка: Неверная длина API ключа ({len(api_key)} символов вместо 32)")
+        print("✅ Формат API ключа корректный (32 символа)")
     
     # Проверка названия города
     print("\n2. Проверка названия города:")
@@ -62,7 +75,7 @@ def test_api_directly():
     try:
         # Выполняем запрос
         print(f"\nОтправляем запрос для города: {city}")
-        response = requests.get(endpoint, params=params)
+        response = _client.get(endpoint, params=params)
         
         # Выводим детали запроса
         print(f"URL запроса: {response.url}")
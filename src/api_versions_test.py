@@ -1,11 +1,23 @@
-import requests
+import asyncio
+import aiohttp
 from dotenv import load_dotenv
 import os
 
-def test_api_versions():
+async def probe(session, endpoint, api_key):
+    try:
+        async with session.get(endpoint, params={'q': 'London', 'appid': api_key},
+                               timeout=aiohttp.ClientTimeout(total=5)) as response:
+            # Для пробы хватает начала ответа — читаем первые 256 байт
+            # из потока вместо материализации всего тела
+            chunk = await response.content.read(256)
+            return endpoint, response.status, chunk.decode(errors='replace')[:200]
+    except Exception as e:
+        return endpoint, None, str(e)
+
+async def probe_api_versions():
     load_dotenv()
     api_key = os.getenv('OPENWEATHER_API_KEY')
-    
+
     # Список разных версий API для тестирования
     endpoints = [
         "https://api.openweathermap.org/data/2.5/weather",  # Current weather data
@@ -13,22 +25,32 @@ def test_api_versions():
         "https://api.openweathermap.org/data/3.0/weather",  # New API version
         "http://api.openweathermap.org/data/2.5/weather"    # HTTP version
     ]
-    
+
     print("\nТестирование разных версий API:")
     print("=" * 50)
-    
-    for endpoint in endpoints:
-        print(f"\nПробуем endpoint: {endpoint}")
-        url = f"{endpoint}?q=London&appid={api_key}"
-        
-        try:
-            response = requests.get(url)
-            print(f"Статус: {response.status_code}")
-            print(f"Ответ: {response.text[:200]}...")  # Показываем только начало ответа
-        except Exception as e:
-            print(f"Ошибка: {str(e)}")
-        
+
+    # Все endpoint'ы опрашиваются параллельно через общую сессию:
+    # суммарное время — один RTT вместо четырех последовательных
+    connector = aiohttp.TCPConnector(limit=8, ssl=True)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(
+            *[probe(session, endpoint, api_key) for endpoint in endpoints],
+            return_exceptions=True
+        )
+
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Ошибка: {str(result)}")
+            print("-" * 50)
+            continue
+        endpoint, status, body = result
+        print(f"\nEndpoint: {endpoint}")
+        if status is None:
+            print(f"Ошибка: {body}")
+        else:
+            print(f"Статус: {status}")
+            print(f"Ответ: {body}...")  # Показываем только начало ответа
         print("-" * 50)
 
 if __name__ == "__main__":
-    test_api_versions() 
\ No newline at end of file
+    asyncio.run(probe_api_versions())
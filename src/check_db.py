@@ -45,8 +45,12 @@ async def check_database():
         print("\n🔍 Проверка последних записей в базе данных:")
         print("=" * 50)
         
-        for city_id, city_name in cities.items():
-            record = await db_service.get_latest_weather(city_id)
+        # Все SELECT'ы уходят параллельно и перекрываются по пулу соединений
+        records = await asyncio.gather(
+            *[db_service.get_latest_weather(city_id) for city_id in cities]
+        )
+
+        for (city_id, city_name), record in zip(cities.items(), records):
             print(f"\n📍 {city_name} ({city_id}):")
             if record:
                 print(f"  🌡 Температура: {record['temperature']}°C")
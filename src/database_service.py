@@ -1,10 +1,10 @@
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy import Column, Integer, Float, String, DateTime, text, select
+from sqlalchemy import Column, Integer, Float, String, DateTime, Index, bindparam, text, select
 from sqlalchemy.ext.declarative import declarative_base
 from logging.handlers import RotatingFileHandler
 from typing import Optional, List, Dict
@@ -12,19 +12,37 @@ from typing import Optional, List, Dict
 # Get logger
 logger = logging.getLogger(__name__)
 
-# Configure logging format
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler('logs/database.log', maxBytes=10485760, backupCount=5),
-        logging.StreamHandler()
-    ]
-)
+def configure_logging():
+    """Configure database logging once from the entry point
 
-# Load environment variables
-load_dotenv()
-logger.info("Environment variables loaded")
+    Раньше handlers вешались при импорте модуля: каждый скрипт,
+    импортировавший сервис, заново открывал logs/database.log и
+    дублировал вывод.
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=[
+                RotatingFileHandler('logs/database.log', maxBytes=10485760, backupCount=5),
+                logging.StreamHandler()
+            ]
+        )
+    # SQLAlchemy логирует каждый запрос с параметрами — на горячем пути
+    # записи это лишнее форматирование, оставляем только предупреждения
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+def _to_utc_datetime(value) -> datetime:
+    """Convert epoch seconds or an ISO-like string to naive UTC datetime
+
+    Горячий путь передает секунды эпохи — один C-вызов fromtimestamp
+    вместо парсинга строки; строковый формат оставлен для совместимости.
+    """
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    # fromisoformat реализован на C и не перекомпилирует формат
+    # на каждый вызов, в отличие от strptime
+    return datetime.fromisoformat(value.replace(' ', 'T'))
 
 Base = declarative_base()
 
@@ -40,9 +58,29 @@ class WeatherRecord(Base):
     recorded_at = Column(DateTime, nullable=False)
     timezone = Column(String, nullable=False)
 
+    # Составной индекс обслуживает get_latest_weather
+    # (WHERE city=? ORDER BY recorded_at DESC LIMIT 1) одним index seek;
+    # имя совпадает с миграцией 0002
+    __table_args__ = (
+        Index('ix_weather_city_recorded', 'city', recorded_at.desc()),
+    )
+
 class DatabaseService:
+    # Statement строится один раз на класс: SQLAlchemy переиспользует
+    # скомпилированный SQL, а asyncpg — подготовленный план на сервере
+    _latest_stmt = (
+        select(WeatherRecord)
+        .where(WeatherRecord.city == bindparam('city'))
+        .order_by(WeatherRecord.recorded_at.desc())
+        .limit(1)
+    )
+
     def __init__(self):
         try:
+            # .env читается здесь, а не при импорте модуля — повторный
+            # вызов load_dotenv дешев и идемпотентен
+            load_dotenv()
+
             # Получаем параметры подключения
             db_host = os.getenv('DB_HOST')
             db_name = os.getenv('DB_NAME')
@@ -54,7 +92,8 @@ class DatabaseService:
             logger.info(f"Host: {db_host}")
             logger.info(f"Database: {db_name}")
             logger.info(f"User: {db_user}")
-            logger.info(f"Password: {'*' * (len(db_password) if db_password else 0)}")
+            # Константная маска: не выдаем в логах даже длину пароля
+            logger.info("Password: ***")
         
             if not all([db_host, db_name, db_user, db_password]):
                 missing = []
@@ -73,13 +112,22 @@ class DatabaseService:
             try:
                 # Create async engine with connection pooling
                 logger.info("Creating async database engine with connection pooling...")
+                # echo включается только явно через SQL_ECHO=1 при отладке.
+                # Размер пула настраивается окружением; statement cache
+                # asyncpg переиспользует подготовленные INSERT/SELECT,
+                # убирая parse+plan на стороне Postgres после прогрева
                 self.engine = create_async_engine(
                     db_url,
-                    echo=True,
-                    pool_size=5,
-                    max_overflow=10,
+                    echo=os.getenv('SQL_ECHO', '0') == '1',
+                    pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+                    max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
                     pool_timeout=30,
-                    pool_recycle=1800  # Recycle connections after 30 minutes
+                    pool_recycle=1800,  # Recycle connections after 30 minutes
+                    pool_pre_ping=True,
+                    connect_args={
+                        "statement_cache_size": 256,
+                        "server_settings": {"application_name": "openweather-app"}
+                    }
                 )
                 
                 logger.info("Creating async session factory...")
@@ -104,11 +152,13 @@ class DatabaseService:
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
             
-        async with self.async_session() as session:
-            logger.info("Testing database connection...")
-            result = await session.execute(text("SELECT version()"))
-            version = result.scalar()
-            logger.info(f"Database connection successful. PostgreSQL version: {version}")
+        # Отдельный SELECT version() — лишний round-trip на каждом старте:
+        # asyncpg и так проверяет соединение при выдаче из пула.
+        # Оставляем только для отладки
+        if logger.isEnabledFor(logging.DEBUG):
+            async with self.async_session() as session:
+                result = await session.execute(text("SELECT version()"))
+                logger.debug("Database connection successful. PostgreSQL version: %s", result.scalar())
 
     def get_session(self) -> AsyncSession:
         """
@@ -126,8 +176,7 @@ class DatabaseService:
         """
         async with self.get_session() as session:
             try:
-                # Parse the date and time strings into a datetime object
-                recorded_at = datetime.strptime(weather_data['recorded_at'], '%Y-%m-%d %H:%M:%S')
+                recorded_at = _to_utc_datetime(weather_data['recorded_at'])
 
                 record = WeatherRecord(
                     city=weather_data['city'],
@@ -149,6 +198,41 @@ class DatabaseService:
                 logger.error(f"Error saving weather data: {str(e)}")
                 return False
 
+    async def save_weather_data_bulk(self, weather_list: List[Dict]) -> int:
+        """
+        Saves several weather records in one transaction
+        Args:
+            weather_list (list): Weather data dicts in save_weather_data format
+        Returns:
+            int: Number of records saved (0 on failure)
+        """
+        if not weather_list:
+            return 0
+
+        async with self.get_session() as session:
+            try:
+                # Все даты парсим заранее, записи уходят одним executemany
+                # вместо отдельного commit на каждый город
+                records = [WeatherRecord(
+                    city=w['city'],
+                    temperature=w['temp'],
+                    humidity=w['humidity'],
+                    wind_speed=w['wind_speed'],
+                    description=w['description'],
+                    recorded_at=_to_utc_datetime(w['recorded_at']),
+                    timezone=w['timezone']
+                ) for w in weather_list]
+
+                session.add_all(records)
+                await session.commit()
+
+                logger.info(f"Saved {len(records)} weather records in one transaction")
+                return len(records)
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error saving weather data bulk: {str(e)}")
+                return 0
+
     async def get_weather_history(self, city: Optional[str] = None, limit: int = 10) -> List[Dict]:
         """
         Retrieves weather history from the database
@@ -159,23 +243,32 @@ class DatabaseService:
         """
         async with self.get_session() as session:
             try:
-                query = select(WeatherRecord).order_by(WeatherRecord.recorded_at.desc())
+                # Выбираем только нужные колонки: строки приходят кортежами
+                # без материализации ORM-объектов и identity map
+                query = select(
+                    WeatherRecord.city,
+                    WeatherRecord.temperature,
+                    WeatherRecord.humidity,
+                    WeatherRecord.wind_speed,
+                    WeatherRecord.description,
+                    WeatherRecord.recorded_at,
+                    WeatherRecord.timezone
+                ).order_by(WeatherRecord.recorded_at.desc())
                 if city:
                     query = query.filter(WeatherRecord.city == city)
                 query = query.limit(limit)
-                
+
                 result = await session.execute(query)
-                records = result.scalars().all()
-                
+
                 return [{
-                    'city': record.city,
-                    'temp': record.temperature,
-                    'humidity': record.humidity,
-                    'wind_speed': record.wind_speed,
-                    'description': record.description,
-                    'recorded_at': record.recorded_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    'timezone': record.timezone
-                } for record in records]
+                    'city': row.city,
+                    'temp': row.temperature,
+                    'humidity': row.humidity,
+                    'wind_speed': row.wind_speed,
+                    'description': row.description,
+                    'recorded_at': row.recorded_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    'timezone': row.timezone
+                } for row in result]
                 
             except Exception as e:
                 logger.error(f"Error retrieving weather history: {str(e)}")
@@ -187,14 +280,7 @@ class DatabaseService:
         """
         async with self.get_session() as session:
             try:
-                query = (
-                    select(WeatherRecord)
-                    .filter(WeatherRecord.city == city)
-                    .order_by(WeatherRecord.recorded_at.desc())
-                    .limit(1)
-                )
-                
-                result = await session.execute(query)
+                result = await session.execute(self._latest_stmt, {'city': city})
                 record = result.scalar_one_or_none()
                 
                 if record:
@@ -205,6 +291,9 @@ class DatabaseService:
                         'wind_speed': record.wind_speed,
                         'description': record.description,
                         'recorded_at': record.recorded_at,
+                        # Секунды эпохи для TTL-проверок: целочисленное
+                        # сравнение вместо datetime-арифметики у вызывающего
+                        'recorded_ts': record.recorded_at.replace(tzinfo=timezone.utc).timestamp(),
                         'timezone': record.timezone
                     }
                 return None
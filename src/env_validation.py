@@ -0,0 +1,30 @@
+import re
+
+# Ключ OpenWeather — 32 шестнадцатеричных символа в нижнем регистре;
+# один скомпилированный regex заменяет посимвольные проверки в скриптах
+API_KEY_RE = re.compile(r'^[a-f0-9]{32}$')
+
+def validate_api_key(api_key):
+    """Проверяет формат API ключа
+
+    Returns:
+        list: Список найденных проблем (пустой — формат корректен)
+    """
+    issues = []
+
+    if not api_key:
+        issues.append("API ключ не задан")
+        return issues
+
+    if api_key != api_key.strip():
+        issues.append("API ключ содержит пробелы в начале или конце")
+    if '"' in api_key or "'" in api_key:
+        issues.append("API ключ содержит кавычки")
+    if '#' in api_key:
+        issues.append("API ключ содержит символ комментария")
+    if len(api_key) != 32:
+        issues.append(f"Неверная длина API ключа ({len(api_key)} символов вместо 32)")
+    if not API_KEY_RE.fullmatch(api_key):
+        issues.append("API ключ должен состоять из 32 символов a-f0-9 в нижнем регистре")
+
+    return issues
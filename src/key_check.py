@@ -1,5 +1,13 @@
 import os
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = str(Path(__file__).parent.parent)
+sys.path.insert(0, project_root)
+
 from dotenv import load_dotenv
+from src.env_validation import API_KEY_RE, validate_api_key
 
 def check_api_key():
     load_dotenv()
@@ -13,27 +21,24 @@ def check_api_key():
     print(f"2. Длина ключа: {len(api_key)} символов")
     print(f"3. Последние символы: {api_key[-2:] if len(api_key) >= 2 else 'ключ слишком короткий'}")
     
-    # Проверка на специальные символы
-    has_special = any(not c.isalnum() for c in api_key)
-    print(f"4. Содержит специальные символы: {'Да' if has_special else 'Нет'}")
-    
-    # Проверка на пробелы
-    has_spaces = any(c.isspace() for c in api_key)
-    print(f"5. Содержит пробелы: {'Да' if has_spaces else 'Нет'}")
-    
-    # Проверка регистра
-    print(f"6. Все символы в нижнем регистре: {'Да' if api_key.islower() else 'Нет'}")
+    # Общий валидатор: один предкомпилированный regex вместо
+    # посимвольных проверок
+    issues = validate_api_key(api_key)
+    has_issues = bool(issues)
+    print(f"4. Формат ключа (32 символа a-f0-9): {'❌' if not API_KEY_RE.fullmatch(api_key) else '✅'}")
+    for issue in issues:
+        print(f"   ❌ {issue}")
     
     # Сравнение с известным окончанием
     expected_suffix = "6b"
     if api_key.endswith(expected_suffix):
-        print(f"7. ✅ Ключ заканчивается на правильные символы: {expected_suffix}")
+        print(f"5. ✅ Ключ заканчивается на правильные символы: {expected_suffix}")
     else:
-        print(f"7. ❌ Ключ должен заканчиваться на: {expected_suffix}")
+        print(f"5. ❌ Ключ должен заканчиваться на: {expected_suffix}")
         print(f"   Текущее окончание: {api_key[-2:] if len(api_key) >= 2 else 'ключ слишком короткий'}")
-    
+
     print("\nРекомендации:")
-    if has_special or has_spaces or not api_key.endswith(expected_suffix):
+    if has_issues or not api_key.endswith(expected_suffix):
         print("- Проверьте, что ключ скопирован правильно")
         print("- Убедитесь, что нет лишних пробелов")
         print("- Ключ должен содержать только буквы и цифры")
@@ -1,21 +1,28 @@
+import hashlib
+import orjson
 import os
 import time
-from typing import List, Optional
-from fastapi import FastAPI, Request, Query
-from fastapi.responses import HTMLResponse
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request, Query, Response
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from src.weather_service import WeatherService
-from src.database_service import DatabaseService
+from src.database_service import DatabaseService, configure_logging as configure_db_logging
 import logging
 import sys
 import asyncio
 from app.telegram_service import TelegramService
 from src.scheduler import WeatherScheduler
+import fcntl
 import signal
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
+
+# Один объект таймзоны на модуль: без повторного lookup'а по имени зоны
+# на каждый город в каждом запросе
+MSK = ZoneInfo('Europe/Moscow')
 
 # Configure logging
 logging.basicConfig(
@@ -29,11 +36,17 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Логирование БД настраивается один раз из точки входа,
+# а не при импорте сервиса
+configure_db_logging()
+
 # Load environment variables
 load_dotenv()
 
 # Initialize FastAPI app
-app = FastAPI(title="OpenWeather Dashboard")
+# orjson сериализует ответы на C и понимает datetime напрямую,
+# минуя jsonable_encoder на каждый запрос
+app = FastAPI(title="OpenWeather Dashboard", default_response_class=ORJSONResponse)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -100,23 +113,25 @@ async def startup_event():
             
 @app.on_event("shutdown")
 async def shutdown_event():
-    if hasattr(weather_service, 'stop_updates'):
-        await weather_service.stop_updates()
-        logger.info("Weather updates stopped")
-    
-    if telegram_service:
-        try:
-            await telegram_service.stop()
-            logger.info("Telegram bot stopped")
-        except Exception as e:
-            logger.error(f"Error stopping Telegram bot: {e}")
+    await _shutdown()
 
 # Mount templates directory
 templates = Jinja2Templates(directory="templates")
+# Шаблоны не меняются на лету: без auto_reload Jinja не делает stat
+# файла на каждый запрос, а прогретый get_template кладет разобранный
+# шаблон в кэш окружения еще при импорте
+templates.env.auto_reload = False
+templates.env.get_template("index.html")
 
 LOCK_FILE = "bot.lock"
 should_stop = False
 
+# Все пути завершения (shutdown-хук FastAPI, сигналы, finally в run_bot
+# и в __main__) сходятся в одну идемпотентную точку: бот не
+# останавливается дважды, а lock-файл не удаляется наперегонки
+_shutdown_lock = asyncio.Lock()
+_shutdown_done = False
+
 def signal_handler(signum, frame):
     """
     Handle termination signals
@@ -125,66 +140,73 @@ def signal_handler(signum, frame):
     logger.info(f"Received signal {signum}. Shutting down gracefully...")
     should_stop = True
 
-def is_process_running(pid):
+# Дескриптор lock-файла живет все время работы процесса: flock снимается
+# ядром автоматически при его смерти, поэтому устаревших lock-файлов
+# и гонки "прочитать pid / kill -0 / перезаписать" больше нет
+_lock_fh = None
+
+def _acquire_lock() -> bool:
     """
-    Check if a process with given PID is running
+    Try to take an exclusive advisory lock on LOCK_FILE
     """
+    global _lock_fh
+    _lock_fh = open(LOCK_FILE, 'a')
     try:
-        os.kill(pid, 0)
+        fcntl.flock(_lock_fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
         return True
-    except OSError:
+    except (BlockingIOError, OSError):
+        _lock_fh.close()
+        _lock_fh = None
         return False
 
-async def cleanup():
+async def _shutdown() -> None:
     """
-    Cleanup function to be called before shutdown
+    Idempotent shutdown: stop services and remove the lock file exactly once
     """
-    global telegram_service
-    if telegram_service:
-        try:
-            await telegram_service.stop_bot()
-        except Exception as e:
-            logger.error(f"Error stopping telegram service: {e}")
-    
-    try:
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
-            logger.info("Lock file removed during cleanup")
-    except Exception as e:
-        logger.error(f"Error removing lock file during cleanup: {e}")
+    global _shutdown_done
+    async with _shutdown_lock:
+        if _shutdown_done:
+            return
+        _shutdown_done = True
+
+        if hasattr(weather_service, 'stop_updates'):
+            try:
+                await weather_service.stop_updates()
+                logger.info("Weather updates stopped")
+            except Exception as e:
+                logger.error(f"Error stopping weather updates: {e}")
+
+        if telegram_service:
+            try:
+                await telegram_service.stop()
+                logger.info("Telegram bot stopped")
+            except Exception as e:
+                logger.error(f"Error stopping Telegram bot: {e}")
+
+        global _lock_fh
+        if _lock_fh is not None:
+            try:
+                # Файловые операции уходят в тред-пул, чтобы не блокировать
+                # event loop на медленном диске
+                await asyncio.to_thread(os.remove, LOCK_FILE)
+                logger.info("Lock file removed during cleanup")
+            except OSError as e:
+                logger.error(f"Error removing lock file during cleanup: {e}")
+            # Закрытие дескриптора отпускает flock
+            _lock_fh.close()
+            _lock_fh = None
 
 async def run_bot() -> None:
     """
     Main function to start the bot and scheduler
     """
     global should_stop
-    
-    # Check if bot is already running
-    if os.path.exists(LOCK_FILE):
-        try:
-            with open(LOCK_FILE, 'r') as f:
-                pid = int(f.read().strip())
-            
-            if is_process_running(pid):
-                logger.error(f"Bot is already running with PID {pid}")
-                return
-            else:
-                logger.info("Found stale lock file, removing it")
-                os.remove(LOCK_FILE)
-        except (ValueError, IOError) as e:
-            logger.error(f"Error reading lock file: {e}")
-            try:
-                os.remove(LOCK_FILE)
-            except OSError as e:
-                logger.error(f"Error removing stale lock file: {e}")
-                return
 
-    # Create lock file with timestamp
-    try:
-        with open(LOCK_FILE, 'w') as f:
-            f.write(f"{os.getpid()}\n{int(time.time())}")
-    except IOError as e:
-        logger.error(f"Could not create lock file: {e}")
+    # Check if bot is already running
+    # Синхронная работа с lock-файлом выполняется в тред-пуле:
+    # сами операции копеечные, но из корутины они блокируют event loop
+    if not await asyncio.to_thread(_acquire_lock):
+        logger.error("Bot is already running (lock file is held)")
         return
 
     # Initialize services
@@ -211,63 +233,132 @@ async def run_bot() -> None:
                 await scheduler_task
             except asyncio.CancelledError:
                 pass
-        
-        # Remove lock file
-        try:
-            if os.path.exists(LOCK_FILE):
-                os.remove(LOCK_FILE)
-                logger.info("Lock file removed during cleanup")
-        except Exception as e:
-            logger.error(f"Error removing lock file during cleanup: {e}")
+
+        await _shutdown()
+
+# Кэш отрендеренной главной страницы: (монотонный срок годности,
+# готовые байты HTML, ETag). Jinja-рендер на попадании не выполняется
+_PAGE_CACHE_TTL = 600.0
+_page_cache: Dict[str, Tuple[float, bytes, str]] = {}
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request, cities: Optional[str] = None):
+    cached = _page_cache.get("index")
+    if cached and time.monotonic() < cached[0]:
+        _, body, etag = cached
+        # Браузер с актуальной копией получает пустой 304 вместо страницы
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return HTMLResponse(
+            content=body,
+            headers={"ETag": etag, "Cache-Control": "max-age=600"}
+        )
+
     weather_data = await weather_service.update_all_cities()
-    
+
     # Convert weather data to format expected by template
-    formatted_data = []
-    for city, data in weather_data:
-        if data:
-            formatted_data.append({
-                "name": city,
-                "main": {
-                    "temp": data.temperature,
-                    "humidity": data.humidity
-                },
-                "weather": [{"description": data.description}],
-                "wind": {"speed": data.wind_speed},
-                "sys": {"country": ""},  # Add country code if available
-                "recorded_at_moscow": datetime.now(pytz.timezone('Europe/Moscow'))
-            })
-        else:
-            formatted_data.append({"error": f"Failed to get weather data for {city}"})
-    
-    return templates.TemplateResponse(
+    # Момент времени один на запрос — вычисляем до цикла по городам
+    recorded_at = datetime.now(MSK)
+    formatted_data = [
+        {
+            "name": city,
+            "temp": data.temperature,
+            "humidity": data.humidity,
+            "description": data.description,
+            "wind_speed": data.wind_speed,
+            "country": "",  # Add country code if available
+            "recorded_at_moscow": recorded_at
+        } if data else {"error": f"Failed to get weather data for {city}"}
+        for city, data in weather_data
+    ]
+
+    response = templates.TemplateResponse(
         "index.html",
         {
-            "request": request, 
+            "request": request,
             "weather_list": formatted_data,
             "db_enabled": db_enabled
         }
     )
 
+    body = response.body
+    etag = f'"{hashlib.md5(body).hexdigest()}"'
+    _page_cache["index"] = (time.monotonic() + _PAGE_CACHE_TTL, body, etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "max-age=600"
+    return response
+
+# Кэш готовых ответов /api/weather: данные OpenWeather обновляются раз
+# в десятки минут, так что повторные запросы в этом окне не должны ходить
+# ни к API, ни пересобирать те же словари
+_WEATHER_CACHE_BASE_TTL = 600.0
+# Записи хранятся как (монотонный срок годности, payload): TTL зависит
+# от типа данных и момента записи, поэтому вычисляется при вставке
+_weather_cache: Dict[str, Tuple[float, object]] = {}
+
+def compute_ttl(now_msk: datetime, kind: str = 'current') -> float:
+    """Pick a TTL for a cache entry based on data kind and wall-clock phase
+
+    Текущая погода вблизи тика публикации OpenWeather (каждые ~10 минут)
+    протухает быстро, в середине интервала — медленно; около полуночи МСК
+    инвалидируются «сегодняшние» поля. История неизменяема и живет дольше.
+    """
+    ttl = _WEATHER_CACHE_BASE_TTL
+    if kind == 'history':
+        return ttl * 1.5
+
+    # Секунды от ближайшего 10-минутного тика публикации
+    seconds_into_tick = (now_msk.minute % 10) * 60 + now_msk.second
+    if seconds_into_tick <= 120 or seconds_into_tick >= 480:
+        ttl *= 0.5
+
+    # Секунды до/после местной полуночи
+    seconds_since_midnight = now_msk.hour * 3600 + now_msk.minute * 60 + now_msk.second
+    if seconds_since_midnight <= 60 or seconds_since_midnight >= 86340:
+        ttl *= 0.2
+
+    return ttl
+
+def _weather_cache_get(key: str):
+    entry = _weather_cache.get(key)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+    return None
+
+def _weather_cache_put(key: str, payload, kind: str = 'current') -> None:
+    ttl = compute_ttl(datetime.now(MSK), kind)
+    _weather_cache[key] = (time.monotonic() + ttl, payload)
+
+def _format_weather_payload(city: str, data, recorded_at: datetime = None) -> dict:
+    return {
+        "name": city,
+        "main": {
+            "temp": data.temperature,
+            "humidity": data.humidity
+        },
+        "weather": [{"description": data.description}],
+        "wind": {"speed": data.wind_speed},
+        "recorded_at_moscow": recorded_at if recorded_at is not None else datetime.now(MSK)
+    }
+
 @app.get("/api/weather")
 async def get_weather(city: Optional[str] = None):
     if not city:
         return {"error": "City parameter is required"}
-    
+
+    cache_key = city.strip().lower()
+    cached = _weather_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Промах кэша — сигнал фоновому циклу обновиться раньше расписания,
+    # чтобы следующие запросы попали в свежий кэш
+    weather_service.request_refresh()
     weather_data = await weather_service.get_weather_by_city(city)
     if weather_data:
-        return {
-            "name": city,
-            "main": {
-                "temp": weather_data.temperature,
-                "humidity": weather_data.humidity
-            },
-            "weather": [{"description": weather_data.description}],
-            "wind": {"speed": weather_data.wind_speed},
-            "recorded_at_moscow": datetime.now(pytz.timezone('Europe/Moscow'))
-        }
+        payload = _format_weather_payload(city, weather_data)
+        _weather_cache_put(cache_key, payload)
+        return payload
     else:
         return {"error": f"Failed to get weather data for {city}"}
 
@@ -276,39 +367,80 @@ async def get_weather_multiple(cities: List[str] = Query(None)):
     if not cities:
         # Если города не указаны, получаем погоду для всех отслеживаемых городов
         weather_data = await weather_service.update_all_cities()
-    else:
-        # Если указаны конкретные города, получаем погоду только для них
-        tasks = [weather_service.get_weather_by_city(city) for city in cities]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        weather_data = list(zip(cities, results))
-    
-    formatted_data = []
-    for city, data in weather_data:
-        if isinstance(data, Exception):
-            formatted_data.append({"error": f"Failed to get weather data for {city}: {str(data)}"})
-        elif data:
-            formatted_data.append({
-                "name": city,
-                "main": {
-                    "temp": data.temperature,
-                    "humidity": data.humidity
-                },
-                "weather": [{"description": data.description}],
-                "wind": {"speed": data.wind_speed},
-                "recorded_at_moscow": datetime.now(pytz.timezone('Europe/Moscow'))
-            })
+
+        recorded_at = datetime.now(MSK)
+        return [
+            _format_weather_payload(city, data, recorded_at)
+            if data else {"error": f"Failed to get weather data for {city}"}
+            for city, data in weather_data
+        ]
+
+    # Раскладываем запрошенные города на кэш-попадания и промахи;
+    # к OpenWeather уходят только промахи
+    hits: List[dict] = []
+    misses = []
+    for city in cities:
+        cached = _weather_cache_get(city.strip().lower())
+        if cached is not None:
+            hits.append(cached)
         else:
-            formatted_data.append({"error": f"Failed to get weather data for {city}"})
-    
-    return formatted_data
+            misses.append(city)
+
+    if misses:
+        # Промахи будят фоновый цикл: общий кэш прогреется к следующим запросам
+        weather_service.request_refresh()
+
+    async def _fetch_city(city: str):
+        try:
+            return city, await weather_service.get_weather_by_city(city)
+        except Exception as e:
+            return city, e
+
+    async def stream():
+        # Стримим JSON по мере готовности городов: клиент получает первый
+        # байт после самого быстрого ответа, а не после самого медленного
+        yield b'['
+        first = True
+        for payload in hits:
+            yield (b'' if first else b',') + orjson.dumps(payload)
+            first = False
+
+        if misses:
+            recorded_at = datetime.now(MSK)
+            for coro in asyncio.as_completed([_fetch_city(city) for city in misses]):
+                city, data = await coro
+                if isinstance(data, Exception):
+                    payload = {"error": f"Failed to get weather data for {city}: {str(data)}"}
+                elif data:
+                    payload = _format_weather_payload(city, data, recorded_at)
+                    _weather_cache_put(city.strip().lower(), payload)
+                else:
+                    payload = {"error": f"Failed to get weather data for {city}"}
+                yield (b'' if first else b',') + orjson.dumps(payload)
+                first = False
+        yield b']'
+
+    return StreamingResponse(stream(), media_type="application/json")
 
 @app.get("/api/weather/history")
-async def get_weather_history(city: Optional[str] = None, limit: int = 10):
+async def get_weather_history(request: Request, city: Optional[str] = None, limit: int = 10):
     if not db_enabled:
         return {"error": "Database is not enabled"}
     try:
-        history = await db_service.get_weather_history(city, limit)
-        return history
+        # История неизменяема — кэшируем с удлиненным TTL; вместе с данными
+        # храним ETag, чтобы повторные опросы дашборда получали пустой 304
+        cache_key = f"history:{(city or '').strip().lower()}:{limit}"
+        cached = _weather_cache_get(cache_key)
+        if cached is not None:
+            history, etag = cached
+        else:
+            history = await db_service.get_weather_history(city, limit)
+            etag = f'"{hashlib.md5(orjson.dumps(history)).hexdigest()}"'
+            _weather_cache_put(cache_key, (history, etag), kind='history')
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return ORJSONResponse(content=history, headers={"ETag": etag})
     except Exception as e:
         logger.error(f"Error getting weather history: {e}")
         return {"error": "Failed to get weather history"}
@@ -334,24 +466,28 @@ if __name__ == '__main__':
         if loop is not None:
             try:
                 # Cancel all running tasks
-                for task in asyncio.all_tasks(loop):
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
                     task.cancel()
-                
-                # Wait for tasks to be cancelled
-                loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
-                
+
+                # Ждем отмененные задачи с таймаутом: зависшая задача
+                # не должна блокировать завершение процесса
+                if tasks:
+                    try:
+                        loop.run_until_complete(asyncio.wait_for(
+                            asyncio.gather(*tasks, return_exceptions=True),
+                            timeout=5.0
+                        ))
+                    except asyncio.TimeoutError:
+                        logger.warning("Tasks did not finish in time, forcing shutdown")
+
+                # Единая точка очистки: повторный вызов безопасен
+                loop.run_until_complete(_shutdown())
+
                 # Stop and close the loop
                 loop.stop()
                 loop.close()
-                
+
                 logger.info("Event loop closed successfully")
             except Exception as e:
-                logger.error(f"Error during event loop cleanup: {e}")
-            finally:
-                # Ensure we remove the lock file
-                if os.path.exists(LOCK_FILE):
-                    try:
-                        os.remove(LOCK_FILE)
-                        logger.info("Lock file removed")
-                    except OSError as e:
-                        logger.error(f"Error removing lock file: {e}") 
\ No newline at end of file
+                logger.error(f"Error during event loop cleanup: {e}") 
\ No newline at end of file
@@ -0,0 +1,79 @@
+import httpx
+from dotenv import load_dotenv
+import os
+
+# Объединяет бывшие official_test.py, sample_test.py и simple_test.py:
+# все запросы идут через один httpx-клиент с keep-alive, так что TLS
+# handshake и DNS-резолв оплачиваются один раз на весь прогон
+SESSION = httpx.Client(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+)
+
+BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+def _build_test_cases(api_key):
+    return [
+        {
+            "name": "Базовый запрос (только город)",
+            "url": BASE_URL,
+            "params": {"q": "London", "appid": api_key}
+        },
+        {
+            "name": "Запрос с метрической системой",
+            "url": BASE_URL,
+            "params": {"q": "London", "appid": api_key, "units": "metric"}
+        },
+        {
+            "name": "Запрос с ID города (London)",
+            "url": BASE_URL,
+            "params": {"id": "2643743", "appid": api_key}  # London city ID
+        },
+        {
+            "name": "Запрос с координатами (London)",
+            "url": BASE_URL,
+            "params": {"lat": "51.5085", "lon": "-0.1257", "appid": api_key}
+        },
+        {
+            "name": "Пример из документации (samples.openweathermap.org)",
+            "url": "https://samples.openweathermap.org/data/2.5/weather",
+            "params": {"q": "London,uk", "appid": api_key}
+        }
+    ]
+
+def run_probes():
+    load_dotenv()
+    api_key = os.getenv('OPENWEATHER_API_KEY', '')
+
+    print("\nПроверка API ключа:")
+    print(f"Длина ключа: {len(api_key)} символов")
+
+    if not api_key:
+        print("❌ Ошибка: API ключ не найден в .env файле")
+        return
+
+    print("\nТестирование разных форматов запроса:")
+    print("=" * 50)
+
+    saw_401 = False
+    for test in _build_test_cases(api_key):
+        print(f"\n{test['name']}:")
+        try:
+            response = SESSION.get(test['url'], params=test['params'])
+            print(f"URL: {response.url}")
+            print(f"Статус: {response.status_code}")
+            print(f"Ответ: {response.text[:200]}...")
+            saw_401 = saw_401 or response.status_code == 401
+        except Exception as e:
+            print(f"Ошибка: {str(e)}")
+        print("-" * 50)
+
+    if saw_401:
+        print("\nПроверьте в личном кабинете:")
+        print("1. Перейдите на https://home.openweathermap.org/api_keys")
+        print("2. Убедитесь, что ключ активен")
+        print("3. Попробуйте сгенерировать новый ключ")
+        print("4. Проверьте статистику использования")
+
+if __name__ == "__main__":
+    run_probes()
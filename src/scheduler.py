@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 from app.weather_service import WeatherService
 from app.database_service import DatabaseService
 from app.telegram_service import TelegramService
-from app.config import TIMEZONE, SCHEDULED_HOURS, SCHEDULED_MINUTES
+from app.config import TIMEZONE, SCHEDULED_MIN_LIST, SCHEDULED_TIMES
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -29,59 +29,46 @@ class WeatherScheduler:
         self.telegram_service = telegram_service
         self.last_update = {}  # Хранение времени последнего обновления для каждого города
         
+    def _next_scheduled(self, now: datetime) -> datetime:
+        """Compute the next scheduled update time after `now`"""
+        for hour, minute in SCHEDULED_TIMES:
+            scheduled_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if scheduled_time > now:
+                return scheduled_time
+
+        # Если сегодня больше нет обновлений, берем первое время на завтра
+        first_hour, first_minute = SCHEDULED_TIMES[0]
+        tomorrow = now + timedelta(days=1)
+        return tomorrow.replace(hour=first_hour, minute=first_minute, second=0, microsecond=0)
+
     async def start_scheduler(self) -> None:
         """
         Start the scheduler for periodic weather updates
+
+        Спим до следующего запланированного времени одним asyncio.sleep
+        вместо пробуждения каждые 30 секунд со сравнением часов и минут:
+        ноль CPU между запусками и нет окна, которое можно проскочить.
         """
+        # Пропущенные обновления проверяем один раз при старте,
+        # дальше расписание ведется по абсолютным дедлайнам
+        try:
+            await self.check_missed_updates()
+        except Exception as e:
+            logger.error("Error checking missed updates at startup: %s", e)
+
         while True:
             try:
                 now = datetime.now(TIMEZONE)
-                current_time = now.time()
-                
-                # Проверяем, нужно ли отправить уведомление
-                if (current_time.hour in SCHEDULED_HOURS and 
-                    current_time.minute == SCHEDULED_MINUTES[current_time.hour] and 
-                    current_time.second < 30):  # Даем 30 секунд окно для отправки
-                    
-                    logger.info(f"Starting scheduled weather data collection at {current_time.strftime('%H:%M:%S')} (Moscow time)")
-                    
-                    # Собираем данные и отправляем уведомления
-                    await self.collect_and_store_weather_data(force_notify=True)
-                    
-                    # Ждем 31 секунду, чтобы гарантированно пропустить текущее окно
-                    await asyncio.sleep(31)
-                else:
-                    # Логируем текущее время и следующее запланированное обновление
-                    next_update = None
-                    for hour in SCHEDULED_HOURS:
-                        scheduled_time = now.replace(
-                            hour=hour, 
-                            minute=SCHEDULED_MINUTES[hour], 
-                            second=0, 
-                            microsecond=0
-                        )
-                        if scheduled_time > now:
-                            next_update = scheduled_time
-                            break
-                    if not next_update:
-                        # Если сегодня больше нет обновлений, берем первое время на завтра
-                        tomorrow = now + timedelta(days=1)
-                        next_update = tomorrow.replace(
-                            hour=SCHEDULED_HOURS[0], 
-                            minute=SCHEDULED_MINUTES[SCHEDULED_HOURS[0]], 
-                            second=0, 
-                            microsecond=0
-                        )
-                    
-                    if current_time.minute == 0 and current_time.second == 0:  # Логируем только в начале каждого часа
-                        logger.info(f"Current time: {current_time.strftime('%H:%M:%S')} (Moscow time), next update scheduled for: {next_update.strftime('%Y-%m-%d %H:%M:%S')}")
-                    
-                    # Проверяем пропущенные обновления каждые 30 секунд
-                    await self.check_missed_updates()
-                    await asyncio.sleep(30)
-                
+                next_update = self._next_scheduled(now)
+                logger.info("Next update scheduled for: %s (Moscow time)", next_update)
+
+                await asyncio.sleep(max(0.0, (next_update - datetime.now(TIMEZONE)).total_seconds()))
+
+                logger.info("Starting scheduled weather data collection at %s (Moscow time)", datetime.now(TIMEZONE).time())
+                await self.collect_and_store_weather_data(force_notify=True)
+
             except Exception as e:
-                logger.error(f"Error in scheduler: {e}")
+                logger.error("Error in scheduler: %s", e)
                 await asyncio.sleep(60)  # Ждем минуту перед повторной попыткой
                 
     async def check_missed_updates(self) -> None:
@@ -90,20 +77,15 @@ class WeatherScheduler:
         """
         now = datetime.now(TIMEZONE)
         
-        for hour in SCHEDULED_HOURS:
+        for hour, minute in SCHEDULED_TIMES:
             # Создаем datetime для запланированного времени
-            scheduled_time = now.replace(
-                hour=hour, 
-                minute=SCHEDULED_MINUTES[hour], 
-                second=0, 
-                microsecond=0
-            )
-            
+            scheduled_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
             # Если запланированное время прошло, но не более 30 минут назад
             if now > scheduled_time and now - scheduled_time <= timedelta(minutes=30):
                 # Проверяем, было ли уже обновление
                 if not any(last_time > scheduled_time for last_time in self.last_update.values()):
-                    logger.info(f"Detected missed update for {hour}:{SCHEDULED_MINUTES[hour]:02d} (Moscow time)")
+                    logger.info("Detected missed update for %d:%02d (Moscow time)", hour, minute)
                     await self.collect_and_store_weather_data(force_notify=True)
                     
     async def collect_and_store_weather_data(self, force_notify: bool = False) -> None:
@@ -113,26 +95,27 @@ class WeatherScheduler:
             force_notify: If True, always send notification regardless of the time
         """
         try:
+            # now берем один раз; %-style логирование откладывает strftime
+            # до момента, когда запись действительно выводится
             current_time = datetime.now(TIMEZONE)
-            logger.info(f"Starting weather data collection at {current_time.strftime('%H:%M:%S')} (Moscow time)")
-            
+            logger.info("Starting weather data collection at %s (Moscow time)", current_time.time())
+
             # Получаем данные о погоде для всех городов
             weather_updates = await self.weather_service.update_all_cities()
-            logger.info(f"Weather data collected for {len(weather_updates)} cities")
-            
+            logger.info("Weather data collected for %d cities", len(weather_updates))
+
             # Обновляем время последнего обновления
             for city, weather_data in weather_updates:
                 if weather_data:
                     self.last_update[city] = current_time
-                    logger.info(f"Updated weather data for {city}")
+                    logger.info("Updated weather data for %s", city)
                 else:
-                    logger.warning(f"Failed to get weather data for {city}")
-            
+                    logger.warning("Failed to get weather data for %s", city)
+
             # Отправляем уведомления, если есть Telegram сервис и это запланированное время
             if self.telegram_service:
-                if force_notify or (current_time.hour in SCHEDULED_HOURS and 
-                                  current_time.minute == SCHEDULED_MINUTES[current_time.hour]):
-                    logger.info(f"Sending weather notifications (force_notify={force_notify}, hour={current_time.hour})")
+                if force_notify or current_time.minute == SCHEDULED_MIN_LIST[current_time.hour]:
+                    logger.info("Sending weather notifications (force_notify=%s, hour=%d)", force_notify, current_time.hour)
                     await self.telegram_service.send_weather_updates(weather_updates)
                     logger.info("Weather notifications sent successfully")
                 else:
@@ -143,7 +126,7 @@ class WeatherScheduler:
             logger.info("Weather data collection and notification process completed")
             
         except Exception as e:
-            logger.error(f"Error in collect_and_store_weather_data: {str(e)}")
+            logger.error("Error in collect_and_store_weather_data: %s", e)
 
 if __name__ == "__main__":
     # Создаем сервисы
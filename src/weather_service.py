@@ -1,19 +1,49 @@
 import logging
+import orjson
+from collections import OrderedDict
 from typing import Optional, Dict, Any, List, Tuple
 import httpx
-from pydantic import BaseModel
+from dataclasses import dataclass
 import os
-from datetime import datetime
-import pytz
+import random
+import time
 import asyncio
 from dotenv import load_dotenv
 from src.database_service import DatabaseService
+from app.config import ALERT_THRESHOLDS
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-class WeatherData(BaseModel):
+# Пороги срабатывания связываются в модульные константы один раз:
+# в цикле проверки остаются только сравнения float'ов
+_TEMP_ALERT_DELTA = ALERT_THRESHOLDS["TEMPERATURE_CHANGE"]
+_WIND_ALERT_SPEED = ALERT_THRESHOLDS["WIND_SPEED"]
+
+# Ограничитель параллельных запросов к OpenWeather: пакетные endpoint'ы
+# перекрывают сетевые ожидания, но не выходят за rate limit API
+_FETCH_SEM = asyncio.Semaphore(10)
+
+# Числовые ID отслеживаемых городов для batch-endpoint'а /group:
+# один HTTPS-запрос возвращает погоду сразу по всем городам
+_CITY_IDS: Dict[str, str] = {
+    "Moscow": "524901",
+    "Saint Petersburg": "498817",
+    "Pskov": "504341",
+    "Belgrade": "792680"
+}
+
+# Список городов и их ID собираются один раз при импорте,
+# а не при каждом цикле обновления
+MONITORED_CITIES: Tuple[str, ...] = ("Moscow", "Saint Petersburg", "Belgrade", "Pskov")
+_CITY_INDEX: Dict[str, int] = {c: i for i, c in enumerate(MONITORED_CITIES)}
+_MONITORED_IDS: List[Optional[str]] = [_CITY_IDS.get(c) for c in MONITORED_CITIES]
+
+# Чистый value-контейнер на горячем пути: slots-датакласс без __dict__
+# и валидаторов создается в разы быстрее Pydantic-модели и вдвое меньше
+@dataclass(slots=True, frozen=True)
+class WeatherData:
     temperature: float
     feels_like: float
     humidity: int
@@ -26,76 +56,253 @@ class WeatherService:
         self.base_url = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
         self.database_service = database_service
         self._last_weather_data: Dict[str, WeatherData] = {}
+        # Адаптивный TTL кэша: EWMA модуля изменения температуры по городу
+        # и вычисленное из нее окно свежести с небольшим джиттером
+        self._temp_ewma: Dict[str, float] = {}
+        self._ttls: Dict[str, float] = {}
+        # Подпись и время последней записи в БД по городу: одинаковые
+        # подряд значения не переписываются
+        self._last_written: Dict[str, Tuple] = {}
+        self._last_write_ts: Dict[str, float] = {}
+        # LRU+TTL кэш перед базой: повторный запрос города в пределах TTL
+        # отвечает из словаря вместо async-запроса к БД
+        self._mem_cache: "OrderedDict[str, Tuple[float, WeatherData]]" = OrderedDict()
+        # Запросы одного города в полете: второй вызов ждет первый
+        # вместо дублирующего обращения к API
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Сильные ссылки на фоновые задачи обновления: event loop держит
+        # task только по слабой ссылке, и без этого сборщик мусора может
+        # снять задачу на полпути
+        self._bg_tasks: set = set()
+        # Событие для внеплановых обновлений: обработчики будят цикл
+        # вместо того, чтобы он крутился по жесткому расписанию
+        self._refresh_event = asyncio.Event()
+        # URL и базовые параметры запроса собираются один раз:
+        # на горячем пути остается только merge словаря с городом
+        self._weather_url = f"{self.base_url}/weather"
+        self._group_url = f"{self.base_url}/group"
+        self._base_params = {"appid": self.api_key, "units": "metric"}
+        # Один клиент на сервис: соединение переиспользуется между
+        # запросами, а HTTP/2 мультиплексирует параллельные вызовы городов
+        self._http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20)
+        )
         
     async def start_updates(self):
         """Start periodic weather updates"""
+        # Повторный запуск не плодит параллельные циклы обновления:
+        # второй цикл удваивал бы нагрузку на API незаметно для логов
+        if getattr(self, '_update_task', None) and not self._update_task.done():
+            logger.warning("Periodic weather updates already running")
+            return
         if self.database_service:
             await self.database_service.initialize_database()
         self._update_task = asyncio.create_task(self._update_loop())
         logger.info("Started periodic weather updates")
-            
+
     async def stop_updates(self):
         """Stop periodic weather updates"""
-        if hasattr(self, '_update_task'):
+        if getattr(self, '_update_task', None):
             self._update_task.cancel()
             try:
                 await self._update_task
             except asyncio.CancelledError:
                 pass
+            self._update_task = None
             logger.info("Stopped periodic weather updates")
+        # Закрываем общий HTTP клиент вместе с остановкой обновлений
+        if not self._http_client.is_closed:
+            await self._http_client.aclose()
         
+    def request_refresh(self) -> None:
+        """Wake the update loop ahead of schedule (e.g. from API handlers)"""
+        self._refresh_event.set()
+
     async def _update_loop(self):
         """Periodic weather update loop"""
+        backoff = 60.0
         while True:
             try:
                 await self.update_all_cities()
-                await asyncio.sleep(1800)  # 30 минут
+                backoff = 60.0
+                # Ждем либо истечения самого короткого адаптивного TTL,
+                # либо явного запроса на обновление; монотонный дедлайн
+                # не дрейфует, а джиттер разносит реплики по времени,
+                # чтобы они не били в API одновременно
+                next_wake = (time.monotonic()
+                             + min(self._ttls.values(), default=1800.0)
+                             + random.uniform(-30.0, 30.0))
+                try:
+                    await asyncio.wait_for(
+                        self._refresh_event.wait(),
+                        timeout=max(0.0, next_wake - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._refresh_event.clear()
             except asyncio.CancelledError:
                 break
             except Exception as e:
+                # Экспоненциальный backoff с джиттером вместо плоской
+                # минуты: транзиентные 5xx/429 не долбятся в одном ритме
                 logger.error(f"Error in update loop: {e}")
-                await asyncio.sleep(60)  # Wait before retry
+                await asyncio.sleep(backoff + random.uniform(0.0, backoff / 4))
+                backoff = min(backoff * 2, 600.0)
                 
     async def update_all_cities(self) -> List[Tuple[str, Optional[WeatherData]]]:
         """
         Update weather data for all monitored cities
-        
+
         Returns:
             List[Tuple[str, Optional[WeatherData]]]: List of (city, weather_data) pairs
         """
-        cities = ["Moscow", "Saint Petersburg", "Belgrade", "Pskov"]
-        tasks = []
-        for city in cities:
-            tasks.append(self.get_weather_by_city(city))
-            
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        weather_updates = []
-        
-        for city, result in zip(cities, results):
-            if isinstance(result, Exception):
-                logger.error(f"Failed to update weather for {city}: {result}")
+        cities = MONITORED_CITIES
+
+        # Если все ID известны, забираем весь пакет одним вызовом /group
+        # вместо HTTPS-запроса на каждый город
+        if all(_MONITORED_IDS):
+            weather_updates = await self._update_cities_group(cities, _MONITORED_IDS)
+            if weather_updates is not None:
+                return weather_updates
+
+        # Фолбэк: по одному запросу на город, ответы обрабатываются
+        # по мере готовности — алерты и записи первого города не ждут
+        # самый медленный
+        async def _fetch(city: str):
+            try:
+                return city, await self.get_weather_by_city(city)
+            except Exception as e:
+                logger.error(f"Failed to update weather for {city}: {e}")
+                return city, None
+
+        results: Dict[str, Optional[WeatherData]] = {}
+        for coro in asyncio.as_completed([_fetch(city) for city in cities]):
+            city, result = await coro
+            results[city] = result
+            # Only check alerts for valid weather data
+            if isinstance(result, WeatherData):
+                self._check_weather_alerts(city, result)
+
+        # Наружу порядок городов остается стабильным
+        return [(city, results[city]) for city in cities]
+
+    async def _update_cities_group(self, cities: List[str],
+                                   ids: List[str]) -> Optional[List[Tuple[str, Optional[WeatherData]]]]:
+        """Fetch weather for all cities in one /group call
+
+        Returns None when the group endpoint fails so the caller can fall
+        back to per-city requests.
+        """
+        params = {**self._base_params, "id": ",".join(ids)}
+
+        try:
+            async with _FETCH_SEM:
+                response = await self._http_client.get(self._group_url, params=params)
+                response.raise_for_status()
+                # orjson парсит байты напрямую, без декодирования в str
+                data = orjson.loads(response.content)
+        except Exception as e:
+            logger.error(f"Group weather request failed, falling back to per-city: {e}")
+            return None
+
+        by_id = {str(item.get("id")): item for item in data.get("list", [])}
+        weather_updates: List[Tuple[str, Optional[WeatherData]]] = []
+        db_records = []
+        now_ts = int(time.time())
+
+        for city, city_id in zip(cities, ids):
+            item = by_id.get(city_id)
+            if not item:
+                logger.warning(f"No data for {city} in group response")
                 weather_updates.append((city, None))
-            else:
-                weather_updates.append((city, result))
-                # Only check alerts for valid weather data
-                if isinstance(result, WeatherData):
-                    self._check_weather_alerts(city, result)
-                    
+                continue
+
+            weather_data = WeatherData(
+                temperature=item["main"]["temp"],
+                feels_like=item["main"]["feels_like"],
+                humidity=item["main"]["humidity"],
+                description=item["weather"][0]["description"],
+                wind_speed=item["wind"]["speed"]
+            )
+            self._check_weather_alerts(city, weather_data)
+            self._mem_cache_put(city, weather_data)
+            weather_updates.append((city, weather_data))
+            if not self._should_write(city, weather_data):
+                continue
+            db_records.append({
+                'city': city,
+                'temp': weather_data.temperature,
+                'humidity': weather_data.humidity,
+                'wind_speed': weather_data.wind_speed,
+                'description': weather_data.description,
+                'recorded_at': now_ts,
+                'timezone': str(item.get("sys", {}).get("timezone", "UTC"))
+            })
+
+        if self.database_service and db_records:
+            saved = await self.database_service.save_weather_data_bulk(db_records)
+            if not saved:
+                logger.warning("Failed to cache group weather data")
+
         return weather_updates
         
+    # Раз в час запись делается принудительно, даже если значения не менялись
+    _MAX_WRITE_INTERVAL = 3600.0
+    # Емкость LRU-кэша; городов четыре, запас на произвольные запросы
+    _MEM_CACHE_SIZE = 64
+
+    def _mem_cache_get(self, city: str) -> Optional[WeatherData]:
+        """Return cached WeatherData if it is still within the city's TTL"""
+        entry = self._mem_cache.get(city)
+        if entry and time.time() - entry[0] < self._ttls.get(city, 1800.0):
+            self._mem_cache.move_to_end(city)
+            return entry[1]
+        return None
+
+    def _mem_cache_put(self, city: str, weather_data: WeatherData) -> None:
+        self._mem_cache[city] = (time.time(), weather_data)
+        self._mem_cache.move_to_end(city)
+        if len(self._mem_cache) > self._MEM_CACHE_SIZE:
+            self._mem_cache.popitem(last=False)
+
+    def _should_write(self, city: str, weather_data: WeatherData) -> bool:
+        """Decide whether the record differs enough to hit the database
+
+        В стабильную погоду подряд приходят одинаковые значения:
+        сравнение кортежа в памяти дешевле INSERT с fsync на диске.
+        """
+        sig = (weather_data.temperature, weather_data.humidity,
+               weather_data.wind_speed, weather_data.description)
+        now = time.time()
+        if (self._last_written.get(city) == sig
+                and now - self._last_write_ts.get(city, 0.0) < self._MAX_WRITE_INTERVAL):
+            return False
+        self._last_written[city] = sig
+        self._last_write_ts[city] = now
+        return True
+
     def _check_weather_alerts(self, city: str, new_data: WeatherData):
         """Check for significant weather changes and log alerts"""
         old_data = self._last_weather_data.get(city)
         if old_data:
             # Check temperature change
             temp_change = abs(new_data.temperature - old_data.temperature)
-            if temp_change >= 5.0:  # Изменение температуры на 5 градусов
+            if temp_change >= _TEMP_ALERT_DELTA:
                 logger.warning(f"Significant temperature change in {city}: {temp_change}°C")
-                
+
             # Check wind speed
-            if new_data.wind_speed >= 15.0:  # Сильный ветер более 15 м/с
+            if new_data.wind_speed >= _WIND_ALERT_SPEED:
                 logger.warning(f"High wind speed alert in {city}: {new_data.wind_speed} m/s")
-                
+
+            # Пересчитываем TTL: стабильная погода кэшируется дольше,
+            # волатильная — короче; джиттер разносит обновления во времени
+            ewma = 0.7 * self._temp_ewma.get(city, 0.0) + 0.3 * temp_change
+            self._temp_ewma[city] = ewma
+            ttl = min(max(1800.0 / (1.0 + 0.5 * ewma), 300.0), 3600.0)
+            self._ttls[city] = ttl + random.uniform(-60.0, 60.0)
+
         self._last_weather_data[city] = new_data
         
     async def get_weather_by_city(self, city: str, units: str = "metric") -> Optional[WeatherData]:
@@ -109,61 +316,73 @@ class WeatherService:
         Returns:
             Optional[WeatherData]: Weather data if successful, None otherwise
         """
+        # Кэш в памяти процесса проверяется до базы: dict-lookup
+        # вместо async round-trip'а к Postgres
+        cached = self._mem_cache_get(city)
+        if cached is not None:
+            return cached
+
+        # Single-flight: параллельные запросы одного города ждут уже
+        # запущенную загрузку, а не дублируют обращение к API
+        fut = self._inflight.get(city)
+        if fut is not None:
+            return await fut
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[city] = fut
+        try:
+            weather_data = await self._fetch_weather(city, units)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(weather_data)
+            return weather_data
+        finally:
+            self._inflight.pop(city, None)
+
+    @staticmethod
+    def _from_cache(row: Dict) -> WeatherData:
+        """Build WeatherData from a DB row (feels_like approximated)
+
+        Единственное место сборки из кэша: свежий, подустаревший и
+        аварийный пути не дублируют один и тот же конструктор.
+        """
+        return WeatherData(
+            temperature=row["temperature"],
+            feels_like=row["temperature"],  # Approximation
+            humidity=row["humidity"],
+            description=row["description"],
+            wind_speed=row["wind_speed"]
+        )
+
+    async def _fetch_weather(self, city: str, units: str) -> Optional[WeatherData]:
+        """Fetch weather for a city from the DB cache or the API"""
         try:
             # First try to get cached data from database
             if self.database_service:
                 cached_data = await self.database_service.get_latest_weather(city)
                 if cached_data:
-                    # Check if data is fresh (less than 30 minutes old)
-                    cache_time = cached_data["recorded_at"]
-                    if (datetime.utcnow() - cache_time).total_seconds() < 1800:
+                    age = time.time() - cached_data["recorded_ts"]
+                    ttl = self._ttls.get(city, 1800.0)
+                    # TTL-проверка — сравнение секунд эпохи без
+                    # datetime-арифметики на каждый вызов
+                    if age < ttl:
                         logger.info(f"Using cached weather data for {city}")
-                        return WeatherData(
-                            temperature=cached_data["temperature"],
-                            feels_like=cached_data["temperature"],  # Approximation
-                            humidity=cached_data["humidity"],
-                            description=cached_data["description"],
-                            wind_speed=cached_data["wind_speed"]
-                        )
+                        weather_data = self._from_cache(cached_data)
+                        self._mem_cache_put(city, weather_data)
+                        return weather_data
+                    if age < 2 * ttl:
+                        # Stale-while-revalidate: слегка устаревшее значение
+                        # отдаем сразу, обновление уходит в фоновую задачу —
+                        # вызывающий не ждет сетевой таймаут API
+                        task = asyncio.create_task(self._refresh_city(city, units))
+                        self._bg_tasks.add(task)
+                        task.add_done_callback(self._bg_tasks.discard)
+                        return self._from_cache(cached_data)
 
             # If no fresh cache, fetch from API
-            params = {
-                "q": city,
-                "appid": self.api_key,
-                "units": units
-            }
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(f"{self.base_url}/weather", params=params)
-                response.raise_for_status()
-                data = response.json()
-
-            weather_data = WeatherData(
-                temperature=data["main"]["temp"],
-                feels_like=data["main"]["feels_like"],
-                humidity=data["main"]["humidity"],
-                description=data["weather"][0]["description"],
-                wind_speed=data["wind"]["speed"]
-            )
-
-            # Cache the new data
-            if self.database_service:
-                now = datetime.utcnow()
-                weather_record = {
-                    'city': city,
-                    'temp': weather_data.temperature,
-                    'humidity': weather_data.humidity,
-                    'wind_speed': weather_data.wind_speed,
-                    'description': weather_data.description,
-                    'recorded_at': now.strftime('%Y-%m-%d %H:%M:%S'),
-                    'timezone': str(data.get("timezone", "UTC"))
-                }
-                
-                success = await self.database_service.save_weather_data(weather_record)
-                if not success:
-                    logger.warning(f"Failed to cache weather data for {city}")
-
-            return weather_data
+            return await self._fetch_from_api(city, units)
 
         except httpx.HTTPError as e:
             logger.error(f"HTTP error fetching weather for {city}: {e}")
@@ -172,15 +391,73 @@ class WeatherService:
                 cached_data = await self.database_service.get_latest_weather(city)
                 if cached_data:
                     logger.info(f"Using stale cached weather data for {city} due to API error")
-                    return WeatherData(
-                        temperature=cached_data["temperature"],
-                        feels_like=cached_data["temperature"],
-                        humidity=cached_data["humidity"],
-                        description=cached_data["description"],
-                        wind_speed=cached_data["wind_speed"]
-                    )
+                    return self._from_cache(cached_data)
             return None
-            
+
         except Exception as e:
             logger.error(f"Error fetching weather for {city}: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+    async def _refresh_city(self, city: str, units: str) -> None:
+        """Background refresh behind a stale-while-revalidate response"""
+        if city in self._inflight:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[city] = fut
+        try:
+            weather_data = await self._fetch_from_api(city, units)
+        except Exception as e:
+            logger.error(f"Background refresh failed for {city}: {e}")
+            fut.set_result(None)
+        else:
+            fut.set_result(weather_data)
+        finally:
+            self._inflight.pop(city, None)
+
+    async def _fetch_from_api(self, city: str, units: str) -> WeatherData:
+        """Fetch weather from the API and update the DB and memory caches"""
+        # Для известных городов запрашиваем по числовому ID: API не
+        # делает геокодинг имени, а "Saint Petersburg" не путается
+        # с американскими тезками
+        city_id = _CITY_IDS.get(city)
+        if city_id is not None:
+            params = {**self._base_params, "id": city_id}
+        else:
+            params = {**self._base_params, "q": city}
+        if units != "metric":
+            params["units"] = units
+
+        async with _FETCH_SEM:
+            response = await self._http_client.get(self._weather_url, params=params)
+            response.raise_for_status()
+            # orjson парсит байты напрямую, без декодирования в str
+            data = orjson.loads(response.content)
+
+        weather_data = WeatherData(
+            temperature=data["main"]["temp"],
+            feels_like=data["main"]["feels_like"],
+            humidity=data["main"]["humidity"],
+            description=data["weather"][0]["description"],
+            wind_speed=data["wind"]["speed"]
+        )
+
+        # Cache the new data unless it matches the last written record
+        if self.database_service and self._should_write(city, weather_data):
+            weather_record = {
+                'city': city,
+                'temp': weather_data.temperature,
+                'humidity': weather_data.humidity,
+                'wind_speed': weather_data.wind_speed,
+                'description': weather_data.description,
+                # Секунды эпохи вместо strftime: форматирование для
+                # человека выполняется только при чтении истории
+                'recorded_at': int(time.time()),
+                'timezone': str(data.get("timezone", "UTC"))
+            }
+            
+            success = await self.database_service.save_weather_data(weather_record)
+            if not success:
+                logger.warning(f"Failed to cache weather data for {city}")
+
+        self._mem_cache_put(city, weather_data)
+        return weather_data 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock
+from sqlalchemy.exc import SQLAlchemyError
+from app.database_service import DatabaseService
+
+
+def make_database_service():
+    """Create DatabaseService over a mocked session factory"""
+    session = AsyncMock()
+
+    @asynccontextmanager
+    async def get_session():
+        yield session
+
+    return DatabaseService(get_session), session
+
+
+@pytest.fixture
+def weather_records():
+    """Batch of records in save_weather_records_batch format"""
+    return [
+        {"city": "Moscow", "temp": 20.5, "humidity": 65,
+         "wind": 3.2, "descr": "clear sky", "tz": "10800"},
+        {"city": "Pskov", "temp": 18.0, "humidity": 70,
+         "wind": 2.1, "descr": "light rain", "tz": "10800"},
+    ]
+
+
+class TestSaveWeatherRecordsBatch:
+    """Test cases for batched weather record saves"""
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_single_execute(self, weather_records):
+        """Test that the whole batch goes to the DB in one statement"""
+        service, session = make_database_service()
+
+        result = await service.save_weather_records_batch(weather_records)
+
+        assert result is True
+        assert session.execute.await_count == 1
+        args, _ = session.execute.await_args
+        assert args[1] == weather_records
+
+    @pytest.mark.asyncio
+    async def test_batch_invalidates_latest_cache(self, weather_records):
+        """Test that a batch write drops the in-memory latest cache"""
+        service, session = make_database_service()
+        service._latest_cache["Moscow"] = (0.0, {"temperature": 1.0})
+
+        await service.save_weather_records_batch(weather_records)
+
+        assert service._latest_cache == {}
+
+    @pytest.mark.asyncio
+    async def test_empty_batch_skips_database(self):
+        """Test that an empty batch succeeds without touching the DB"""
+        service, session = make_database_service()
+
+        result = await service.save_weather_records_batch([])
+
+        assert result is True
+        session.execute.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_batch_database_error_returns_false(self, weather_records):
+        """Test that a database error is reported as failure"""
+        service, session = make_database_service()
+        session.execute.side_effect = SQLAlchemyError("insert failed")
+
+        result = await service.save_weather_records_batch(weather_records)
+
+        assert result is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
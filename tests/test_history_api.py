@@ -0,0 +1,74 @@
+import os
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+
+# src.scheduler проверяет токены при импорте — для тестов достаточно заглушек
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test_token")
+os.environ.setdefault("OPENWEATHER_API_KEY", "test_api_key")
+
+import src.main as dashboard
+
+
+@pytest.fixture
+def history_rows():
+    """Sample history rows as returned by the database"""
+    return [
+        {"city": "Moscow", "temperature": 20.5, "humidity": 65,
+         "wind_speed": 3.2, "description": "clear sky"},
+        {"city": "Moscow", "temperature": 19.0, "humidity": 70,
+         "wind_speed": 2.8, "description": "few clouds"},
+    ]
+
+
+@pytest.fixture
+def client(monkeypatch, history_rows):
+    """Create test client with a mocked database service"""
+    mock_db = AsyncMock()
+    mock_db.get_weather_history.return_value = history_rows
+    monkeypatch.setattr(dashboard, "db_service", mock_db)
+    monkeypatch.setattr(dashboard, "db_enabled", True)
+    dashboard._weather_cache.clear()
+    return TestClient(dashboard.app)
+
+
+class TestWeatherHistoryEndpoint:
+    """Test cases for /api/weather/history conditional responses"""
+
+    def test_history_returns_etag(self, client, history_rows):
+        """Test that history response carries an ETag header"""
+        response = client.get("/api/weather/history?city=Moscow")
+        assert response.status_code == 200
+        assert "etag" in response.headers
+        assert response.json() == history_rows
+
+    def test_history_if_none_match_returns_304(self, client):
+        """Test that a matching If-None-Match yields an empty 304"""
+        first = client.get("/api/weather/history?city=Moscow")
+        etag = first.headers["etag"]
+
+        second = client.get("/api/weather/history?city=Moscow",
+                            headers={"If-None-Match": etag})
+
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert second.content == b""
+
+    def test_history_repeat_request_uses_cache(self, client):
+        """Test that repeated requests are served from the cache"""
+        client.get("/api/weather/history?city=Moscow")
+        client.get("/api/weather/history?city=Moscow")
+
+        # БД опрашивается один раз, дальше отвечает кэш
+        assert dashboard.db_service.get_weather_history.await_count == 1
+
+    def test_history_disabled_database(self, client, monkeypatch):
+        """Test history endpoint without a database"""
+        monkeypatch.setattr(dashboard, "db_enabled", False)
+        response = client.get("/api/weather/history")
+        assert response.status_code == 200
+        assert response.json() == {"error": "Database is not enabled"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
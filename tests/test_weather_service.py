@@ -1,5 +1,6 @@
 import pytest
 import asyncio
+import orjson
 from unittest.mock import Mock, AsyncMock, patch
 from app.weather_service import WeatherService, WeatherData
 from app.telegram_service import TelegramService
@@ -50,7 +51,8 @@ class TestWeatherService:
         with patch('httpx.AsyncClient.get') as mock_get:
             mock_response = Mock()
             mock_response.status_code = 200
-            mock_response.json.return_value = {
+            mock_response.headers = {}
+            mock_response.content = orjson.dumps({
                 "main": {
                     "temp": 20.5,
                     "feels_like": 22.0,
@@ -58,7 +60,7 @@ class TestWeatherService:
                 },
                 "weather": [{"description": "clear sky"}],
                 "wind": {"speed": 3.2}
-            }
+            })
             mock_get.return_value = mock_response
             
             result = await weather_service.get_weather_by_city("Moscow")
@@ -96,6 +98,34 @@ class TestWeatherService:
                 assert city_id in ["Moscow", "Saint Petersburg", "Pskov", "Belgrade"]
                 assert weather_data is not None or weather_data is None
 
+    @pytest.mark.asyncio
+    async def test_get_weather_by_city_single_flight(self, weather_service):
+        """Test that concurrent requests for one city share a single fetch"""
+        fetch_count = 0
+
+        async def slow_fetch(city_id, units):
+            nonlocal fetch_count
+            fetch_count += 1
+            await asyncio.sleep(0.01)
+            return WeatherData(
+                temperature=10.0,
+                feels_like=9.0,
+                humidity=80,
+                description="fog",
+                wind_speed=1.5,
+                last_update=datetime.now()
+            )
+
+        with patch.object(weather_service, '_fetch_weather', side_effect=slow_fetch):
+            results = await asyncio.gather(
+                weather_service.get_weather_by_city("Moscow", force_update=True),
+                weather_service.get_weather_by_city("Moscow", force_update=True)
+            )
+
+        # Второй вызов должен дождаться первый, а не дублировать запрос
+        assert fetch_count == 1
+        assert results[0] is results[1]
+
 
 class TestTelegramService:
     """Test cases for TelegramService"""
@@ -107,14 +137,14 @@ class TestTelegramService:
         
         assert telegram_service.token == "test_token"
         assert telegram_service.weather_service == mock_weather_service
-        assert telegram_service.subscribed_chats == []
+        assert telegram_service.subscribed_chats == set()
     
     @pytest.mark.asyncio
     async def test_send_weather_updates(self, mock_weather_data):
         """Test sending weather updates to subscribed users"""
         mock_weather_service = Mock()
         telegram_service = TelegramService("test_token", mock_weather_service)
-        telegram_service.subscribed_chats = [12345, 67890]
+        telegram_service.subscribed_chats = {12345, 67890}
         
         weather_updates = [
             ("Moscow", mock_weather_data),
@@ -130,6 +160,53 @@ class TestTelegramService:
             # Should be 2 calls (one for each subscribed chat)
             assert mock_app.bot.send_message.call_count == 2
 
+    def test_broadcast_signature_stable(self, mock_weather_data):
+        """Test that identical payloads produce identical signatures"""
+        weather_updates = [("Moscow", mock_weather_data), ("Pskov", None)]
+
+        sig1 = TelegramService._broadcast_signature(weather_updates)
+        sig2 = TelegramService._broadcast_signature(weather_updates)
+
+        assert sig1 == sig2
+        assert sig1[1] == ("Pskov", None)
+
+    def test_broadcast_signature_changes_with_data(self, mock_weather_data):
+        """Test that a value change produces a different signature"""
+        changed = WeatherData(
+            temperature=25.0,
+            feels_like=22.0,
+            humidity=65,
+            description="clear sky",
+            wind_speed=3.2,
+            last_update=datetime.now()
+        )
+
+        sig1 = TelegramService._broadcast_signature([("Moscow", mock_weather_data)])
+        sig2 = TelegramService._broadcast_signature([("Moscow", changed)])
+
+        assert sig1 != sig2
+
+    def test_broadcast_signature_unfingerprintable(self):
+        """Test that non-numeric payloads yield None (broadcast anyway)"""
+        assert TelegramService._broadcast_signature([("Moscow", Mock())]) is None
+
+    @pytest.mark.asyncio
+    async def test_send_weather_updates_skips_unchanged(self, mock_weather_data):
+        """Test that an identical repeat broadcast is suppressed"""
+        mock_weather_service = Mock()
+        mock_weather_service.get_cached_report.return_value = "report"
+        telegram_service = TelegramService("test_token", mock_weather_service)
+        telegram_service.subscribed_chats = {12345}
+
+        weather_updates = [("Moscow", mock_weather_data)]
+
+        with patch.object(telegram_service, '_broadcast', new_callable=AsyncMock) as mock_broadcast:
+            await telegram_service.send_weather_updates(weather_updates)
+            await telegram_service.send_weather_updates(weather_updates)
+
+            # Повторная рассылка тех же данных не уходит в Telegram
+            assert mock_broadcast.call_count == 1
+
 
 class TestDatabaseService:
     """Test cases for DatabaseService"""